@@ -0,0 +1,160 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple, Iterable, Set
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Ключ серии: (режим, ID темы)
+SeriesKey = Tuple[str, Optional[int]]
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Разбирает created_at из Supabase в datetime с часовым поясом UTC"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+class SessionActivity:
+    """Почасовые и посуточные счетчики сессий по режиму и теме.
+
+    Счетчики обновляются инкрементально: каждая новая сессия (по водяному
+    знаку created_at) увеличивает один часовой и один суточный бакет.
+    Часовые бакеты старше hourly_retention_hours отбрасываются — для
+    длинных периодов остаются только суточные (downsampling).
+    """
+
+    def __init__(self, hourly_retention_hours: int = 72, daily_retention_days: int = 400):
+        self.hourly_retention_hours = hourly_retention_hours
+        self.daily_retention_days = daily_retention_days
+        self.hourly: Dict[int, Counter] = {}
+        self.daily: Dict[int, Counter] = {}
+        self.watermark: Optional[str] = None
+        self.last_refresh: Optional[datetime] = None
+        # ID сессий с created_at == watermark, чтобы не считать их повторно
+        self._ids_at_watermark: Set[Any] = set()
+
+    def add_sessions(self, sessions: Iterable[Dict[str, Any]]) -> int:
+        """Добавить сессии (отсортированные по created_at) в бакеты"""
+        added = 0
+        watermark_dt = parse_timestamp(self.watermark)
+        for session in sessions:
+            created_at = session.get("created_at")
+            dt = parse_timestamp(created_at)
+            if dt is None:
+                continue
+            if watermark_dt is not None and dt < watermark_dt:
+                # Уже учтена предыдущей загрузкой
+                continue
+
+            session_id = session.get("id")
+            if created_at == self.watermark:
+                if session_id in self._ids_at_watermark:
+                    continue
+                self._ids_at_watermark.add(session_id)
+            else:
+                self.watermark = created_at
+                watermark_dt = dt
+                self._ids_at_watermark = {session_id}
+
+            ts = int(dt.timestamp())
+            key = (session.get("mode") or "learning", session.get("topicid"))
+            self.hourly.setdefault(ts - ts % HOUR, Counter())[key] += 1
+            self.daily.setdefault(ts - ts % DAY, Counter())[key] += 1
+            added += 1
+
+        self.last_refresh = datetime.now(timezone.utc)
+        self.downsample()
+        return added
+
+    def downsample(self, now: Optional[datetime] = None) -> None:
+        """Удалить часовые и суточные бакеты за пределами хранения"""
+        now_ts = int((now or datetime.now(timezone.utc)).timestamp())
+        hourly_cutoff = now_ts - now_ts % HOUR - self.hourly_retention_hours * HOUR
+        daily_cutoff = now_ts - now_ts % DAY - self.daily_retention_days * DAY
+
+        for bucket in [b for b in self.hourly if b < hourly_cutoff]:
+            del self.hourly[bucket]
+        for bucket in [b for b in self.daily if b < daily_cutoff]:
+            del self.daily[bucket]
+
+    @staticmethod
+    def _bucket_count(counter: Optional[Counter], mode: Optional[str], topic_id: Optional[int]) -> int:
+        if not counter:
+            return 0
+        if mode is None and topic_id is None:
+            return sum(counter.values())
+        return sum(
+            count for (key_mode, key_topic), count in counter.items()
+            if (mode is None or key_mode == mode) and (topic_id is None or key_topic == topic_id)
+        )
+
+    def series(
+            self,
+            granularity: str = "day",
+            periods: int = 90,
+            mode: Optional[str] = None,
+            topic_id: Optional[int] = None,
+            now: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Ряд количества сессий за последние periods часов/дней (с нулями)"""
+        if granularity == "hour":
+            step, buckets = HOUR, self.hourly
+            periods = min(periods, self.hourly_retention_hours)
+        else:
+            step, buckets = DAY, self.daily
+            periods = min(periods, self.daily_retention_days)
+
+        now_ts = int((now or datetime.now(timezone.utc)).timestamp())
+        current = now_ts - now_ts % step
+
+        result = []
+        for i in range(periods - 1, -1, -1):
+            bucket = current - i * step
+            result.append({
+                "t": datetime.fromtimestamp(bucket, timezone.utc).isoformat(),
+                "count": self._bucket_count(buckets.get(bucket), mode, topic_id)
+            })
+        return result
+
+    def count_last_hours(self, hours: int = 24, now: Optional[datetime] = None) -> int:
+        """Количество сессий за последние hours часов (по часовым бакетам).
+
+        Окно захватывает текущий неполный час, hours - 1 полных часов и часть
+        самого старого бакета; его вклад берется пропорционально доле часа,
+        попавшей в окно (внутри бакета сессии считаются равномерными).
+        """
+        now = now or datetime.now(timezone.utc)
+        points = self.series("hour", hours + 1, now=now)
+        if len(points) <= hours:
+            return sum(point["count"] for point in points)
+        elapsed = int(now.timestamp()) % HOUR / HOUR
+        oldest = points[0]["count"] * (1 - elapsed)
+        return int(round(oldest + sum(point["count"] for point in points[1:])))
+
+    def breakdown(self, granularity: str = "day", periods: int = 90) -> Dict[str, Dict[Any, int]]:
+        """Суммы за период в разрезе режимов и тем"""
+        step, buckets = (HOUR, self.hourly) if granularity == "hour" else (DAY, self.daily)
+        now_ts = int(datetime.now(timezone.utc).timestamp())
+        cutoff = now_ts - now_ts % step - (periods - 1) * step
+
+        by_mode: Counter = Counter()
+        by_topic: Counter = Counter()
+        for bucket, counter in buckets.items():
+            if bucket < cutoff:
+                continue
+            for (mode, topic_id), count in counter.items():
+                by_mode[mode] += count
+                by_topic[topic_id] += count
+
+        return {"by_mode": dict(by_mode), "by_topic": dict(by_topic)}
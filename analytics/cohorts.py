@@ -0,0 +1,152 @@
+from typing import Dict, Any, List, Iterable, Sequence, Tuple
+
+import numpy as np
+
+NO_GROUP = "Без группы"
+PERCENTILES = (25, 50, 75, 90)
+
+
+def _encode(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Словарное кодирование: массив кодов и список уникальных значений"""
+    labels: Dict[Any, int] = {}
+    codes = np.fromiter(
+        (labels.setdefault(value, len(labels)) for value in values),
+        dtype=np.int32,
+        count=len(values)
+    )
+    return codes, list(labels)
+
+
+def _to_float(value: Any) -> float:
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class CohortTable:
+    """Строки student_progress в колоночном виде с кодами группы, темы и студента"""
+
+    def __init__(self, progress_rows: List[Dict[str, Any]], student_groups: Dict[Any, Any]):
+        size = len(progress_rows)
+        student_ids = [row.get("studentid") for row in progress_rows]
+
+        self.group, self.groups = _encode([student_groups.get(sid) or NO_GROUP for sid in student_ids])
+        self.topic, self.topics = _encode([row.get("topicid") for row in progress_rows])
+        self.student, self.students = _encode(student_ids)
+        self.topic_names: Dict[Any, str] = {row.get("topicid"): row.get("topicname") or "" for row in progress_rows}
+
+        self.practice_done = np.fromiter((bool(r.get("practice_done")) for r in progress_rows), dtype=bool, count=size)
+        self.test_done = np.fromiter((bool(r.get("test_done")) for r in progress_rows), dtype=bool, count=size)
+        practice_score = np.fromiter((_to_float(r.get("practice_score")) for r in progress_rows), dtype=np.float64, count=size)
+        test_score = np.fromiter((_to_float(r.get("test_score")) for r in progress_rows), dtype=np.float64, count=size)
+
+        # Балл по теме: среднее из сданных практики и теста
+        practice_score[~self.practice_done] = np.nan
+        test_score[~self.test_done] = np.nan
+        both = np.stack([practice_score, test_score])
+        counts = (~np.isnan(both)).sum(axis=0)
+        self.score = np.divide(np.nansum(both, axis=0), counts, out=np.full(size, np.nan), where=counts > 0)
+
+    def __len__(self) -> int:
+        return len(self.group)
+
+
+def _group_percentiles(group: np.ndarray, values: np.ndarray, group_count: int) -> np.ndarray:
+    """Перцентили значений внутри каждой группы (линейная интерполяция) без цикла по группам"""
+    result = np.full((group_count, len(PERCENTILES)), np.nan)
+    valid = ~np.isnan(values)
+    group, values = group[valid], values[valid]
+    if not len(values):
+        return result
+
+    order = np.lexsort((values, group))
+    sorted_values = values[order]
+    sizes = np.bincount(group, minlength=group_count)
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    has_values = sizes > 0
+
+    for column, p in enumerate(PERCENTILES):
+        position = (sizes - 1).clip(min=0) * (p / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        fraction = position - lower
+        low_values = sorted_values[(offsets + lower)[has_values]]
+        high_values = sorted_values[(offsets + upper)[has_values]]
+        result[has_values, column] = low_values + (high_values - low_values) * fraction[has_values]
+    return result
+
+
+def cohort_stats(table: CohortTable, bins: int = 10) -> Dict[str, Any]:
+    """Статистика по группам за один векторный проход по строкам прогресса"""
+    group_count = len(table.groups)
+    topic_count = len(table.topics)
+    if not len(table):
+        return {"groups": [], "topics": [], "histogram_edges": [], "rows": 0}
+
+    done = table.practice_done | table.test_done
+    rows_per_group = np.bincount(table.group, minlength=group_count)
+    done_per_group = np.bincount(table.group, weights=done, minlength=group_count)
+    completion = done_per_group / np.maximum(rows_per_group, 1)
+
+    # Уникальные студенты в группе
+    pairs = np.unique(table.group.astype(np.int64) * len(table.students) + table.student)
+    students_per_group = np.bincount(pairs // len(table.students), minlength=group_count)
+
+    # Доля завершения по теме внутри группы: матрица группа x тема
+    cell = table.group.astype(np.int64) * topic_count + table.topic
+    cell_rows = np.bincount(cell, minlength=group_count * topic_count).reshape(group_count, topic_count)
+    cell_done = np.bincount(cell, weights=done, minlength=group_count * topic_count).reshape(group_count, topic_count)
+    topic_completion = np.divide(cell_done, cell_rows, out=np.full(cell_rows.shape, np.nan), where=cell_rows > 0)
+
+    # Средний балл, перцентили и гистограмма баллов
+    scored = ~np.isnan(table.score)
+    score_sum = np.bincount(table.group[scored], weights=table.score[scored], minlength=group_count)
+    score_count = np.bincount(table.group[scored], minlength=group_count)
+    score_mean = np.divide(score_sum, score_count, out=np.full(group_count, np.nan), where=score_count > 0)
+    percentiles = _group_percentiles(table.group, table.score, group_count)
+
+    top = float(np.nanmax(table.score)) if scored.any() else 0.0
+    edges = np.linspace(0.0, max(top, 1.0), bins + 1)
+    score_bin = np.clip(np.searchsorted(edges, table.score[scored], side="right") - 1, 0, bins - 1)
+    histogram = np.bincount(
+        table.group[scored].astype(np.int64) * bins + score_bin,
+        minlength=group_count * bins
+    ).reshape(group_count, bins)
+
+    def rounded(value: float) -> Any:
+        return None if np.isnan(value) else round(float(value), 1)
+
+    groups = []
+    for g in np.argsort(-completion, kind="stable"):
+        groups.append({
+            "group": table.groups[g],
+            "students": int(students_per_group[g]),
+            "rows": int(rows_per_group[g]),
+            "completion_rate": round(float(completion[g]) * 100, 1),
+            "score_mean": rounded(score_mean[g]),
+            "percentiles": {f"p{p}": rounded(percentiles[g, i]) for i, p in enumerate(PERCENTILES)},
+            "histogram": histogram[g].tolist(),
+            "topics": [
+                None if np.isnan(value) else round(float(value) * 100, 1)
+                for value in topic_completion[g]
+            ]
+        })
+
+    return {
+        "groups": groups,
+        "topics": [
+            {"topicid": topic_id, "topicname": table.topic_names.get(topic_id, "")}
+            for topic_id in table.topics
+        ],
+        "histogram_edges": [round(float(edge), 1) for edge in edges],
+        "rows": len(table)
+    }
+
+
+def build_cohorts(progress_rows: List[Dict[str, Any]], students: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Собрать колонки из строк прогресса и stdlist и посчитать статистику по группам"""
+    student_groups = {student.get("id"): student.get("Group") for student in students}
+    return cohort_stats(CohortTable(progress_rows, student_groups))
@@ -0,0 +1,349 @@
+import base64
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Set
+
+import numpy as np
+
+from analytics.activity import parse_timestamp
+
+
+def _is_answered(answer: Any) -> bool:
+    return answer is not None and answer != "" and answer != {} and answer != []
+
+
+def _correctness(answer: Any) -> float:
+    """1.0/0.0, если ответ содержит признак правильности, иначе NaN"""
+    if isinstance(answer, dict):
+        for key in ("correct", "is_correct", "isCorrect"):
+            if key in answer and answer[key] is not None:
+                return 1.0 if answer[key] else 0.0
+    return np.nan
+
+
+def _question_text(question: Any) -> str:
+    if isinstance(question, dict):
+        for key in ("question", "text", "title"):
+            if question.get(key):
+                return str(question[key])
+    return str(question)
+
+
+class SessionColumns:
+    """Колоночное хранилище сессий и их вопросов на массивах NumPy.
+
+    Сессии добавляются чанками; каждый чанк раскладывается в отдельные
+    массивы, а склейка (np.concatenate) выполняется лениво при чтении.
+    """
+
+    SESSION_FIELDS = {
+        "topic": np.int64, "length": np.int32, "answered": np.int32, "index": np.int32, "total": np.int32
+    }
+    ITEM_FIELDS = {
+        "session": np.int64, "topic": np.int64, "position": np.int32, "index": np.int32,
+        "question": np.int64, "answered": bool, "correct": np.float64
+    }
+
+    def __init__(self):
+        self.size = 0
+        self._session_chunks: List[Dict[str, np.ndarray]] = []
+        self._item_chunks: List[Dict[str, np.ndarray]] = []
+        self._sessions: Optional[Dict[str, np.ndarray]] = None
+        self._items: Optional[Dict[str, np.ndarray]] = None
+
+    def append(self, sessions: List[Dict[str, Any]], intern: Dict[str, int]) -> None:
+        """Развернуть массивы questions/answers чанка сессий в колонки"""
+        count = len(sessions)
+        if not count:
+            return
+
+        s_topic = np.empty(count, dtype=np.int64)
+        s_length = np.empty(count, dtype=np.int32)
+        s_answered = np.empty(count, dtype=np.int32)
+        s_index = np.empty(count, dtype=np.int32)
+        s_total = np.empty(count, dtype=np.int32)
+
+        i_session: List[int] = []
+        i_position: List[int] = []
+        i_question: List[int] = []
+        i_answered: List[bool] = []
+        i_correct: List[float] = []
+
+        for n, session in enumerate(sessions):
+            questions = session.get("questions") or []
+            answers = session.get("answers") or []
+            if not isinstance(questions, list):
+                questions = []
+            if not isinstance(answers, list):
+                answers = []
+
+            answered_count = 0
+            for position, question in enumerate(questions):
+                answer = answers[position] if position < len(answers) else None
+                answered = _is_answered(answer)
+                answered_count += answered
+
+                text = _question_text(question)
+                code = intern.setdefault(text, len(intern))
+
+                i_session.append(self.size + n)
+                i_position.append(position)
+                i_question.append(code)
+                i_answered.append(answered)
+                i_correct.append(_correctness(answer))
+
+            s_topic[n] = session.get("topicid") or 0
+            s_length[n] = len(questions)
+            s_answered[n] = answered_count
+            s_index[n] = session.get("current_index") or 0
+            s_total[n] = session.get("total") or len(questions)
+
+        i_session_arr = np.asarray(i_session, dtype=np.int64)
+        self._session_chunks.append({
+            "topic": s_topic,
+            "length": s_length,
+            "answered": s_answered,
+            "index": s_index,
+            "total": s_total
+        })
+        self._item_chunks.append({
+            "session": i_session_arr,
+            "topic": s_topic[i_session_arr - self.size] if len(i_session_arr) else np.empty(0, dtype=np.int64),
+            "position": np.asarray(i_position, dtype=np.int32),
+            "index": s_index[i_session_arr - self.size] if len(i_session_arr) else np.empty(0, dtype=np.int32),
+            "question": np.asarray(i_question, dtype=np.int64),
+            "answered": np.asarray(i_answered, dtype=bool),
+            "correct": np.asarray(i_correct, dtype=np.float64)
+        })
+        self.size += count
+        self._sessions = None
+        self._items = None
+
+    def dump(self) -> Dict[str, Any]:
+        """Колонки в JSON-совместимом виде (массивы в base64)"""
+        def encode(columns: Dict[str, np.ndarray]) -> Dict[str, str]:
+            return {field: base64.b64encode(array.tobytes()).decode("ascii") for field, array in columns.items()}
+
+        return {"size": self.size, "sessions": encode(self.sessions), "items": encode(self.items)}
+
+    @classmethod
+    def load(cls, data: Dict[str, Any]) -> "SessionColumns":
+        """Восстановить колонки, сохраненные dump()"""
+        def decode(columns: Dict[str, str], fields: Dict[str, Any]) -> Dict[str, np.ndarray]:
+            return {
+                field: np.frombuffer(base64.b64decode(columns[field]), dtype=dtype).copy()
+                for field, dtype in fields.items()
+            }
+
+        columns = cls()
+        columns.size = data["size"]
+        if columns.size:
+            columns._session_chunks = [decode(data["sessions"], cls.SESSION_FIELDS)]
+            columns._item_chunks = [decode(data["items"], cls.ITEM_FIELDS)]
+        return columns
+
+    @staticmethod
+    def _concat(chunks: List[Dict[str, np.ndarray]], fields: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        if not chunks:
+            return {field: np.empty(0, dtype=dtype) for field, dtype in fields.items()}
+        return {field: np.concatenate([chunk[field] for chunk in chunks]) for field in fields}
+
+    @property
+    def sessions(self) -> Dict[str, np.ndarray]:
+        if self._sessions is None:
+            self._sessions = self._concat(self._session_chunks, self.SESSION_FIELDS)
+            self._session_chunks = [self._sessions] if self.size else []
+        return self._sessions
+
+    @property
+    def items(self) -> Dict[str, np.ndarray]:
+        if self._items is None:
+            self._items = self._concat(self._item_chunks, self.ITEM_FIELDS)
+            self._item_chunks = [self._items] if self.size else []
+        return self._items
+
+
+def _merge(a: Dict[str, np.ndarray], b: Dict[str, np.ndarray], fields: Iterable[str]) -> Dict[str, np.ndarray]:
+    return {field: np.concatenate([a[field], b[field]]) for field in fields}
+
+
+class QuestionAnalytics:
+    """Статистика по вопросам сессий: сложность, доля ответов, точки выхода.
+
+    Сессии старше settle_hours считаются завершенными и один раз попадают
+    в frozen-колонки (водяной знак created_at). Более свежие сессии еще
+    меняются (бот дописывает answers), поэтому хранятся отдельно в tail
+    и перечитываются при каждом обновлении.
+    """
+
+    def __init__(self, settle_hours: int = 6):
+        self.settle_hours = settle_hours
+        self.intern: Dict[str, int] = {}
+        self.frozen = SessionColumns()
+        self.tail = SessionColumns()
+        self.watermark: Optional[str] = None
+        self.version = 0
+        self.last_refresh: Optional[datetime] = None
+        self._ids_at_watermark: Set[Any] = set()
+        self._results: Dict[int, Dict[str, Any]] = {}
+        self._tail_fingerprint: Optional[int] = None
+
+    def add_frozen(self, sessions: List[Dict[str, Any]]) -> int:
+        """Добавить устоявшиеся сессии (по возрастанию created_at)"""
+        fresh = []
+        watermark_dt = parse_timestamp(self.watermark)
+        for session in sessions:
+            created_at = session.get("created_at")
+            session_id = session.get("id")
+            created_dt = parse_timestamp(created_at)
+            if watermark_dt is not None and created_dt is not None and created_dt < watermark_dt:
+                # Уже в frozen-колонках
+                continue
+            if created_at == self.watermark:
+                if session_id in self._ids_at_watermark:
+                    continue
+                self._ids_at_watermark.add(session_id)
+            else:
+                self.watermark = created_at
+                watermark_dt = created_dt
+                self._ids_at_watermark = {session_id}
+            fresh.append(session)
+
+        self.frozen.append(fresh, self.intern)
+        if fresh:
+            self._invalidate()
+        return len(fresh)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Устоявшаяся часть (frozen, словарь вопросов, водяной знак) для общего кэша"""
+        return {
+            "watermark": self.watermark,
+            "ids_at_watermark": list(self._ids_at_watermark),
+            "texts": self._texts(),
+            "frozen": self.frozen.dump()
+        }
+
+    def restore(self, snapshot: Dict[str, Any]) -> bool:
+        """Взять снимок другого воркера, если он новее своих данных"""
+        snapshot_dt = parse_timestamp(snapshot.get("watermark"))
+        watermark_dt = parse_timestamp(self.watermark)
+        if snapshot_dt is None or (watermark_dt is not None and snapshot_dt <= watermark_dt):
+            return False
+
+        self.frozen = SessionColumns.load(snapshot["frozen"])
+        self.intern = {text: code for code, text in enumerate(snapshot["texts"])}
+        self.watermark = snapshot["watermark"]
+        self._ids_at_watermark = set(snapshot["ids_at_watermark"])
+        # Коды вопросов в tail выданы старым словарем: tail перечитается заново
+        self.tail = SessionColumns()
+        self._tail_fingerprint = None
+        self._invalidate()
+        return True
+
+    def replace_tail(self, sessions: List[Dict[str, Any]]) -> None:
+        """Заменить свежие (еще изменяющиеся) сессии, если они изменились"""
+        fingerprint = hash(tuple(
+            (session.get("id"), session.get("current_index"), len(session.get("answers") or []))
+            for session in sessions
+        ))
+        if fingerprint == self._tail_fingerprint:
+            return
+
+        self._tail_fingerprint = fingerprint
+        self.tail = SessionColumns()
+        self.tail.append(sessions, self.intern)
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        self.version += 1
+        self._results = {}
+
+    def topic_stats(self, topic_id: int) -> Dict[str, Any]:
+        """Статистика по теме; результат кэшируется до следующего обновления данных"""
+        if topic_id not in self._results:
+            self._results[topic_id] = self._compute(topic_id)
+        return self._results[topic_id]
+
+    def _compute(self, topic_id: int) -> Dict[str, Any]:
+        sessions = _merge(self.frozen.sessions, self.tail.sessions, SessionColumns.SESSION_FIELDS)
+        items = _merge(self.frozen.items, self.tail.items, SessionColumns.ITEM_FIELDS)
+
+        smask = sessions["topic"] == topic_id
+        length = sessions["length"][smask].astype(np.int64)
+        answered = sessions["answered"][smask].astype(np.int64)
+        index = sessions["index"][smask].astype(np.int64)
+        total = sessions["total"][smask].astype(np.int64)
+
+        session_count = int(smask.sum())
+        completed = (index >= total) | ((length > 0) & (answered >= length))
+        answered_share = np.divide(answered, length, out=np.zeros(len(length)), where=length > 0)
+
+        # Где бросают: позиция current_index у незавершенных сессий
+        max_length = int(length.max()) if session_count else 0
+        dropped_at = np.clip(index[~completed], 0, max(max_length - 1, 0))
+        dropoff = np.bincount(dropped_at, minlength=max_length) if max_length else np.zeros(0, dtype=np.int64)
+
+        # Вопрос задан, только если сессия до него дошла (позиция не дальше
+        # current_index) или на него уже ответили; заранее сгенерированный
+        # хвост списка вопросов не учитывается
+        imask = (items["topic"] == topic_id) & ((items["position"] <= items["index"]) | items["answered"])
+        positions = items["position"][imask].astype(np.int64)
+        codes = items["question"][imask].astype(np.int64)
+        item_answered = items["answered"][imask].astype(np.float64)
+        correct = items["correct"][imask]
+
+        # По позиции вопроса в сессии
+        position_asked = np.bincount(positions, minlength=max_length)
+        position_answered = np.bincount(positions, weights=item_answered, minlength=max_length)
+        reached = position_asked.astype(np.float64)
+
+        # По конкретному вопросу
+        unique_codes, inverse = np.unique(codes, return_inverse=True)
+        asked = np.bincount(inverse, minlength=len(unique_codes)).astype(np.float64)
+        answered_by_q = np.bincount(inverse, weights=item_answered, minlength=len(unique_codes))
+        graded_mask = ~np.isnan(correct)
+        graded = np.bincount(inverse[graded_mask], minlength=len(unique_codes)).astype(np.float64)
+        correct_sum = np.bincount(inverse[graded_mask], weights=correct[graded_mask], minlength=len(unique_codes))
+
+        answer_rate = np.divide(answered_by_q, asked, out=np.zeros(len(asked)), where=asked > 0)
+        accuracy = np.divide(correct_sum, graded, out=np.full(len(graded), np.nan), where=graded > 0)
+        # Сложность: доля неверных ответов, а без оценок — доля вопросов без ответа
+        difficulty = np.where(np.isnan(accuracy), 1.0 - answer_rate, 1.0 - accuracy)
+
+        texts = self._texts()
+        order = np.argsort(-difficulty, kind="stable")
+        questions = [
+            {
+                "question": texts[unique_codes[i]],
+                "asked": int(asked[i]),
+                "answer_rate": round(float(answer_rate[i]) * 100, 1),
+                "accuracy": None if np.isnan(accuracy[i]) else round(float(accuracy[i]) * 100, 1),
+                "difficulty": round(float(difficulty[i]) * 100, 1)
+            }
+            for i in order
+        ]
+
+        return {
+            "topic_id": topic_id,
+            "sessions": session_count,
+            "completed_sessions": int(completed.sum()),
+            "completion_rate": round(float(completed.mean()) * 100, 1) if session_count else 0,
+            "avg_answered_share": round(float(answered_share.mean()) * 100, 1) if session_count else 0,
+            "positions": [
+                {
+                    "position": p + 1,
+                    "reached": int(position_asked[p]),
+                    "answer_rate": round(float(position_answered[p] / reached[p]) * 100, 1) if reached[p] else 0,
+                    "dropoff": int(dropoff[p]) if p < len(dropoff) else 0
+                }
+                for p in range(max_length)
+            ],
+            "questions": questions,
+            "watermark": self.watermark,
+            "version": self.version
+        }
+
+    def _texts(self) -> List[str]:
+        texts = [""] * len(self.intern)
+        for text, code in self.intern.items():
+            texts[code] = text
+        return texts
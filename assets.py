@@ -0,0 +1,256 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+# Собранные файлы: static/dist/<путь с хешем>, рядом .gz/.br и manifest.json
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+# Манифест предыдущей сборки: его файлы не удаляются, пока страницы со старыми ссылками еще открыты
+PREVIOUS_MANIFEST_NAME = "manifest.previous.json"
+ASSET_EXTENSIONS = {".css", ".js", ".woff2", ".woff", ".ttf", ".svg", ".png", ".jpg", ".ico", ".json"}
+COMPRESSIBLE = {".css", ".js", ".svg", ".ttf", ".json"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+SOURCE_MAP = re.compile(r"^\s*/[/*]# sourceMappingURL=.*$", re.MULTILINE)
+
+
+def _hashed_name(path: str, content: bytes) -> str:
+    """css/style.css -> css/style.<12 символов sha256>.css"""
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _write_atomic(path: str, content: bytes) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _write_if_missing(path: str, content: bytes) -> bool:
+    """Атомарно записать файл; имена с хешем не меняются, поэтому существующий не трогаем"""
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, content)
+    return True
+
+
+def _compress(path: str, content: bytes) -> None:
+    """Подготовить .gz и .br (если установлен brotli), когда они меньше оригинала"""
+    if not os.path.exists(path + ".gz"):
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            _write_if_missing(path + ".gz", compressed)
+    if not os.path.exists(path + ".br"):
+        try:
+            import brotli
+        except ImportError:
+            return
+        compressed = brotli.compress(content, quality=11)
+        if len(compressed) < len(content):
+            _write_if_missing(path + ".br", compressed)
+
+
+def _rewrite_css(path: str, content: bytes, manifest: Dict[str, str]) -> bytes:
+    """Заменить url(...) в CSS на относительные пути к файлам с хешем"""
+    # Файл с хешем лежит в том же каталоге, что и исходный
+    base_dir = posixpath.dirname(path)
+
+    def replace(match: re.Match) -> str:
+        url = match.group(2).strip()
+        if url.startswith(("data:", "http:", "https:", "//", "#", "/")):
+            return match.group(0)
+        target, suffix = re.match(r"([^?#]*)(.*)", url).groups()
+        logical = posixpath.normpath(posixpath.join(base_dir, target))
+        if logical not in manifest:
+            print(f"Error in build_assets: {path} ссылается на отсутствующий {logical}")
+            return match.group(0)
+        return f"url({posixpath.relpath(manifest[logical], base_dir)}{suffix})"
+
+    return CSS_URL.sub(replace, content.decode("utf-8")).encode("utf-8")
+
+
+def _read_manifest(path: str) -> Dict[str, str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _prune(dist_dir: str, keep: Iterable[str]) -> int:
+    """Удалить из dist/ файлы сборок, на которые не ссылаются текущий и предыдущий манифесты"""
+    keep = set(keep) | {MANIFEST_NAME, PREVIOUS_MANIFEST_NAME}
+    removed = 0
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            if name.endswith(".tmp"):
+                # Файл в процессе записи другим воркером
+                continue
+            full = os.path.join(root, name)
+            path = os.path.relpath(full, dist_dir).replace(os.sep, "/")
+            if path.endswith((".gz", ".br")):
+                path = path[:-3]
+            if path not in keep:
+                try:
+                    os.remove(full)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+    return removed
+
+
+def _sources(static_dir: str) -> List[str]:
+    """Логические пути исходных файлов статики (без собранного dist/)"""
+    paths = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if not (root == static_dir and d == DIST_DIR))
+        for name in sorted(files):
+            if posixpath.splitext(name)[1] in ASSET_EXTENSIONS:
+                full = os.path.join(root, name)
+                paths.append(os.path.relpath(full, static_dir).replace(os.sep, "/"))
+    return paths
+
+
+def build_assets(static_dir: str = "static") -> Dict[str, str]:
+    """Собрать статику: имена с хешем содержимого, .gz/.br и manifest.json.
+
+    Шрифты и скрипты обрабатываются раньше CSS, чтобы url(...) в CSS
+    указывали на уже известные имена с хешем. Повторная сборка без
+    изменений ничего не пишет, кроме манифеста. Файлы сборок старше
+    предыдущей удаляются.
+    """
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    manifest: Dict[str, str] = {}
+    sources = _sources(static_dir)
+
+    for path in sorted(sources, key=lambda p: p.endswith(".css")):
+        with open(os.path.join(static_dir, path), "rb") as f:
+            content = f.read()
+        ext = posixpath.splitext(path)[1]
+        if ext in (".css", ".js"):
+            # Карты исходников не поставляются, браузер не должен их запрашивать
+            content = SOURCE_MAP.sub("", content.decode("utf-8")).encode("utf-8")
+        if ext == ".css":
+            content = _rewrite_css(path, content, manifest)
+        manifest[path] = _hashed_name(path, content)
+
+        output = os.path.join(dist_dir, *manifest[path].split("/"))
+        _write_if_missing(output, content)
+        if ext in COMPRESSIBLE:
+            _compress(output, content)
+
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    previous_path = os.path.join(dist_dir, PREVIOUS_MANIFEST_NAME)
+    os.makedirs(dist_dir, exist_ok=True)
+    current = _read_manifest(manifest_path)
+    if current and current != manifest:
+        _write_atomic(previous_path, json.dumps(current, indent=2, sort_keys=True).encode("utf-8"))
+    _write_atomic(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+    _prune(dist_dir, list(manifest.values()) + list(_read_manifest(previous_path).values()))
+    return manifest
+
+
+class AssetManifest:
+    """URL статики по манифесту сборки (глобальная функция asset() в шаблонах).
+
+    Без собранного манифеста возвращает исходный путь /static/..., чтобы
+    панель работала и до первой сборки.
+    """
+
+    def __init__(self, static_dir: str = "static", url_prefix: str = "/static"):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix
+        self._entries: Optional[Dict[str, str]] = None
+
+    def load(self) -> None:
+        try:
+            with open(os.path.join(self.static_dir, DIST_DIR, MANIFEST_NAME), encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def url(self, path: str) -> str:
+        if self._entries is None:
+            self.load()
+        hashed = self._entries.get(path)
+        if hashed is None:
+            return f"{self.url_prefix}/{path}"
+        return f"{self.url_prefix}/{DIST_DIR}/{hashed}"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles, который отдает готовые .br/.gz и кэширует файлы с хешем навсегда.
+
+    Для файлов из dist/ (имя меняется вместе с содержимым) ставится
+    Cache-Control immutable на год; исходные файлы отдаются с no-cache,
+    чтобы браузер перепроверял их по ETag.
+    """
+
+    ENCODINGS: Tuple[Tuple[str, str], ...] = (("br", ".br"), ("gzip", ".gz"))
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        normalized = path.replace(os.sep, "/")
+        # Манифесты лежат в dist/, но имя у них без хеша
+        fingerprinted = normalized.startswith(DIST_DIR + "/") and posixpath.basename(normalized) not in (
+            MANIFEST_NAME, PREVIOUS_MANIFEST_NAME
+        )
+        if fingerprinted and scope["method"] in ("GET", "HEAD"):
+            response = await self._precompressed(path, scope)
+            if response is not None:
+                return response
+
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE if fingerprinted else "no-cache"
+            if fingerprinted:
+                response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    async def _precompressed(self, path: str, scope: Scope) -> Optional[Response]:
+        request_headers = Headers(scope=scope)
+        accepted = {
+            part.split(";")[0].strip().lower()
+            for part in request_headers.get("accept-encoding", "").split(",")
+        }
+        for encoding, suffix in self.ENCODINGS:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            response = FileResponse(full_path, stat_result=stat_result, method=scope["method"], media_type=media_type)
+            response.headers["Content-Encoding"] = encoding
+            response.headers["Cache-Control"] = IMMUTABLE
+            response.headers["Vary"] = "Accept-Encoding"
+            if self.is_not_modified(response.headers, request_headers):
+                return Response(status_code=304, headers={
+                    "ETag": response.headers["etag"],
+                    "Cache-Control": IMMUTABLE,
+                    "Vary": "Accept-Encoding"
+                })
+            return response
+        return None
+
+
+if __name__ == "__main__":
+    built = build_assets()
+    print(f"Собрано файлов: {len(built)}")
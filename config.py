@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from functools import lru_cache
 from typing import Optional
 
 
@@ -8,6 +9,15 @@ class Settings(BaseSettings):
     supabase_key: str
 
 
+    # Бэкенд тяжелых отчетов: supabase (PostgREST) или postgres (прямое подключение)
+    database_backend: str = "supabase"
+    database_dsn: Optional[str] = None
+    postgres_pool_min_size: int = 1
+    postgres_pool_max_size: int = 10
+    # 0 — для pgbouncer в режиме transaction (пулер Supabase), где prepared statements не живут
+    postgres_statement_cache_size: int = 100
+
+
     admin_username: str = "admin"
     admin_password: str = "admin123"
     secret_key: str = "your-secret-key-here-change-in-production"
@@ -21,9 +31,82 @@ class Settings(BaseSettings):
 
     page_size: int = 20
 
+
+    # Кэш слоя данных: memory (в процессе), sqlite (общий файл для воркеров), redis
+    cache_backend: str = "memory"
+    cache_url: Optional[str] = None
+    cache_ttl_seconds: int = 30
+
+
+    # Устойчивость обращений к бэкенду
+    backend_timeout_seconds: float = 5.0
+    backend_retries: int = 2
+    backend_retry_base_delay: float = 0.2
+    backend_max_concurrency: int = 16
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30.0
+    stale_ttl_seconds: int = 86400
+    max_in_flight_requests: int = 64
+    max_event_loop_lag_seconds: float = 0.5
+
+
+    # Локальное зеркало таблиц для отчетов (SQLite)
+    mirror_enabled: bool = False
+    mirror_path: str = "mirror.sqlite3"
+    mirror_max_staleness_seconds: int = 60
+    mirror_full_resync_seconds: int = 3600
+    mirror_batch_size: int = 1000
+    # Свежие сессии меняются (бот двигает current_index), их окно перечитывается при каждой синхронизации
+    mirror_session_tail_hours: int = 6
+
+
+    # Аналитика активности сессий
+    activity_refresh_seconds: int = 30
+    activity_batch_size: int = 1000
+    activity_hourly_retention_hours: int = 72
+    activity_daily_retention_days: int = 400
+
+
+    # Аналитика вопросов сессий
+    question_analytics_chunk_size: int = 500
+    question_analytics_settle_hours: int = 6
+    question_analytics_refresh_seconds: int = 60
+    # Снимок устоявшихся сессий в общем кэше: история читается одним воркером, а не каждым
+    question_analytics_snapshot_ttl_seconds: int = 604800
+
+
+    # Аналитика по группам
+    cohort_batch_size: int = 1000
+
+
+    # Лента активности студента
+    timeline_page_size: int = 20
+    timeline_max_page_size: int = 100
+
+
+    # Профилирование запросов (заголовок X-Profile или ?profile=, только для администратора)
+    profiling_enabled: bool = True
+    profiling_interval_ms: float = 5.0
+    profiling_dir: str = "profiles"
+    profiling_keep: int = 50
+
+
+    # Статика: сборка static/dist (имена с хешем, .gz/.br) при запуске
+    assets_build_on_startup: bool = True
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
-settings = Settings()
\ No newline at end of file
+@lru_cache
+def get_settings() -> Settings:
+    """Настройки создаются при первом обращении, а не при импорте модуля"""
+    return Settings()
+
+
+def __getattr__(name: str):
+    # Совместимость с `from config import settings`
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,386 @@
+import asyncio
+import json
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class CacheBackend:
+    """Базовый интерфейс кэша для слоя данных.
+
+    Наследники реализуют только синхронные примитивы над сырыми строками
+    (_get_raw, _set_raw, _add_raw, _delete_raw, _incr_raw). Публичные
+    методы асинхронные: у сетевых и файловых хранилищ (blocking = True)
+    примитивы выполняются в потоке, чтобы не останавливать цикл событий.
+    Инвалидация сделана через счетчик поколений пространства имен:
+    invalidate() увеличивает поколение в общем хранилище, и все воркеры,
+    использующие то же хранилище, сразу перестают видеть старые ключи.
+    """
+
+    lock_ttl = 30
+    blocking = True
+    # Хранилище общее для воркеров (в нем имеет смысл держать большие снимки)
+    shared = True
+
+    # Примитивы хранилища
+    def _get_raw(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set_raw(self, key: str, value: str, ttl: int) -> None:
+        raise NotImplementedError
+
+    def _add_raw(self, key: str, value: str, ttl: int) -> bool:
+        """Записать значение, только если ключа нет. True — если записали"""
+        raise NotImplementedError
+
+    def _delete_raw(self, key: str) -> None:
+        raise NotImplementedError
+
+    def _incr_raw(self, key: str) -> int:
+        raise NotImplementedError
+
+    # Общая логика
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполнить синхронную операцию хранилища, не блокируя цикл событий"""
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _key(self, namespace: str, key: str) -> str:
+        generation = self._get_raw(f"gen:{namespace}") or "0"
+        return f"{namespace}:{generation}:{key}"
+
+    def _lookup(self, namespace: str, key: str) -> Tuple[str, Optional[str]]:
+        """Полный ключ текущего поколения и значение по нему — за один переход в поток"""
+        full_key = self._key(namespace, key)
+        return full_key, self._get_raw(full_key)
+
+    def _lookup_or_lock(self, namespace: str, key: str) -> Tuple[str, Optional[str], bool]:
+        """Значение, а если его нет — попытка взять блокировку загрузки"""
+        full_key, raw = self._lookup(namespace, key)
+        if raw is not None:
+            return full_key, raw, False
+        return full_key, None, self._add_raw(f"lock:{full_key}", "1", self.lock_ttl)
+
+    def _poll(self, full_key: str) -> Tuple[Optional[str], bool]:
+        """Значение и признак того, что блокировку загрузки еще держат"""
+        # Блокировка читается первой: значение записывается до ее снятия,
+        # поэтому без блокировки значение (если загрузка удалась) уже видно
+        lock_held = self._get_raw(f"lock:{full_key}") is not None
+        return self._get_raw(full_key), lock_held
+
+    def _store(self, namespace: str, key: str, value: str, ttl: int) -> None:
+        self._set_raw(self._key(namespace, key), value, ttl)
+
+    def _store_and_unlock(self, full_key: str, value: str, ttl: int) -> None:
+        self._set_raw(full_key, value, ttl)
+        self._delete_raw(f"lock:{full_key}")
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        _, raw = await self._run(self._lookup, namespace, key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: int) -> None:
+        await self._run(self._store, namespace, key, json.dumps(value, default=str), ttl)
+
+    async def invalidate(self, namespace: str) -> None:
+        """Сбросить все ключи пространства имен во всех воркерах"""
+        await self._run(self._incr_raw, f"gen:{namespace}")
+
+    async def get_or_load(
+            self,
+            namespace: str,
+            key: str,
+            loader: Callable[[], Awaitable[Any]],
+            ttl: int
+    ) -> Any:
+        """Вернуть значение из кэша или загрузить его.
+
+        Загрузку выполняет только один воркер (блокировка через _add_raw),
+        остальные ждут появления значения в общем хранилище.
+        """
+        full_key, raw, locked = await self._run(self._lookup_or_lock, namespace, key)
+        if raw is not None:
+            return json.loads(raw)
+
+        if not locked:
+            deadline = time.monotonic() + self.lock_ttl
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                raw, lock_held = await self._run(self._poll, full_key)
+                if raw is not None:
+                    return json.loads(raw)
+                if not lock_held:
+                    break
+
+        try:
+            value = await loader()
+        except BaseException:
+            await self._run(self._delete_raw, f"lock:{full_key}")
+            raise
+        await self._run(self._store_and_unlock, full_key, json.dumps(value, default=str), ttl)
+        return value
+
+
+class InProcessCache(CacheBackend):
+    """Кэш в памяти процесса (по умолчанию, один воркер).
+
+    Операции не блокируют, поэтому выполняются прямо в цикле событий.
+    Просроченные ключи удаляются периодической чисткой, ключи старого
+    поколения — сразу при invalidate(); сверх max_entries вытесняются
+    самые старые записи (кроме счетчиков поколений).
+    """
+
+    blocking = False
+    shared = False
+
+    def __init__(self, max_entries: int = 10000, sweep_interval: float = 60.0):
+        self._data: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+
+    def _sweep(self, now: float) -> None:
+        if now - self._last_sweep > self.sweep_interval:
+            self._last_sweep = now
+            for key in [k for k, (_, expires_at) in self._data.items() if expires_at and expires_at < now]:
+                del self._data[key]
+        if len(self._data) > self.max_entries:
+            # Словарь хранит порядок вставки: первыми вытесняются самые старые записи
+            evictable = [k for k, (_, expires_at) in self._data.items() if expires_at]
+            for key in evictable[:len(self._data) - self.max_entries]:
+                del self._data[key]
+
+    def _get_raw(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at and expires_at < time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def _set_raw(self, key: str, value: str, ttl: int) -> None:
+        now = time.time()
+        self._data.pop(key, None)
+        self._data[key] = (value, now + ttl if ttl else 0)
+        self._sweep(now)
+
+    def _add_raw(self, key: str, value: str, ttl: int) -> bool:
+        with self._lock:
+            if self._get_raw(key) is not None:
+                return False
+            self._set_raw(key, value, ttl)
+            return True
+
+    def _delete_raw(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def _incr_raw(self, key: str) -> int:
+        with self._lock:
+            previous = self._get_raw(key) or "0"
+            value = int(previous) + 1
+            self._set_raw(key, str(value), 0)
+            if key.startswith("gen:"):
+                # Ключи прошлого поколения больше никто не прочитает
+                prefix = f"{key[len('gen:'):]}:{previous}:"
+                for stale in [k for k in self._data if k.startswith(prefix)]:
+                    del self._data[stale]
+            return value
+
+
+class SQLiteCache(CacheBackend):
+    """Кэш в файле SQLite, общий для воркеров на одной машине"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._last_cleanup = 0.0
+        self._connection().executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            """
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _cleanup(self, now: float) -> None:
+        if now - self._last_cleanup > 60:
+            self._last_cleanup = now
+            self._connection().execute(
+                "DELETE FROM cache WHERE expires_at > 0 AND expires_at < ?", (now,)
+            )
+
+    def _get_raw(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at = 0 OR expires_at >= ?)",
+            (key, now)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_raw(self, key: str, value: str, ttl: int) -> None:
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl if ttl else 0)
+        )
+        self._cleanup(now)
+
+    def _add_raw(self, key: str, value: str, ttl: int) -> bool:
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM cache WHERE key = ? AND expires_at > 0 AND expires_at < ?", (key, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl if ttl else 0)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def _delete_raw(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _incr_raw(self, key: str) -> int:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = int(row[0]) + 1 if row else 1
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, 0)",
+                (key, str(value))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+
+class RedisCache(CacheBackend):
+    """Кэш в Redis (или совместимом сервере) по протоколу RESP без внешних зависимостей"""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile("rb")
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", str(self.db))
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def _send(self, *args: str) -> Any:
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode("utf-8")
+            payload.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(payload))
+        return self._read_reply()
+
+    def _read_reply(self) -> Any:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Redis: соединение закрыто")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            raise RuntimeError(f"Redis: {body.decode()}")
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length == -1:
+                return None
+            data = self._file.read(length + 2)[:-2]
+            return data.decode("utf-8")
+        if prefix == b"*":
+            length = int(body)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RuntimeError(f"Redis: неизвестный ответ {line!r}")
+
+    def command(self, *args: str) -> Any:
+        """Выполнить команду, переподключившись один раз при обрыве"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(*args)
+                except (ConnectionError, OSError):
+                    self._close()
+                    if attempt:
+                        raise
+
+    def _get_raw(self, key: str) -> Optional[str]:
+        return self.command("GET", key)
+
+    def _set_raw(self, key: str, value: str, ttl: int) -> None:
+        if ttl:
+            self.command("SET", key, value, "EX", str(ttl))
+        else:
+            self.command("SET", key, value)
+
+    def _add_raw(self, key: str, value: str, ttl: int) -> bool:
+        return self.command("SET", key, value, "EX", str(ttl), "NX") == "OK"
+
+    def _delete_raw(self, key: str) -> None:
+        self.command("DEL", key)
+
+    def _incr_raw(self, key: str) -> int:
+        return self.command("INCR", key)
+
+
+def create_cache(backend: str, url: Optional[str] = None) -> CacheBackend:
+    """Создать кэш по имени бэкенда из настроек"""
+    if backend == "memory":
+        return InProcessCache()
+    if backend == "sqlite":
+        return SQLiteCache(url or "cache.sqlite3")
+    if backend == "redis":
+        return RedisCache(url or "redis://localhost:6379/0")
+    raise ValueError(f"Неизвестный бэкенд кэша: {backend}")
@@ -0,0 +1,241 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Зеркалируемые таблицы: колонка водяного знака и колонки, которые
+# раскладываются в отдельные поля для агрегатов (вся строка лежит в data).
+# select — какие колонки читать (по умолчанию все), tail — строки меняются
+# после вставки, поэтому окно свежих строк перечитывается каждый раз,
+# full — небольшой справочник с правками, перечитывается целиком каждый раз
+MIRROR_TABLES: Dict[str, Dict[str, Any]] = {
+    "stdlist": {
+        "watermark": "createdat",
+        "columns": ["fullname", "tgid", "isactive", "createdat", "Group"],
+        "full": True
+    },
+    "topiclist": {
+        "watermark": "id",
+        "columns": ["topicname", "topicdesc", "isactive", "subjectid", "date_of_completion"],
+        "full": True
+    },
+    "subjectlist": {
+        "watermark": "id",
+        "columns": ["subjectname"],
+        "full": True
+    },
+    "sessionlist": {
+        "watermark": "created_at",
+        "columns": ["tgid", "mode", "topicid", "total", "current_index", "created_at"],
+        # questions/answers для отчетов не нужны, а занимают большую часть строки
+        "select": "id, tgid, mode, topicid, total, current_index, created_at",
+        "tail": True
+    },
+    "tasklist": {
+        "watermark": "id",
+        "columns": ["studentid", "topicid"]
+    },
+    "testlist": {
+        "watermark": "id",
+        "columns": ["studentid", "topicid"]
+    },
+}
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class LocalMirror:
+    """Локальная копия таблиц Supabase в SQLite для отчетных запросов.
+
+    Синхронизация инкрементальная: забираются строки с водяным знаком
+    (id или created_at) не меньше сохраненного и вставляются через upsert
+    по id. Справочники (full) перечитываются целиком, свежие строки таблиц с
+    tail — при каждой синхронизации; остальные изменения ловит периодическая
+    фоновая полная пересинхронизация (см. SupabaseClient.sync_mirror).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS mirror_state ("
+            "tbl TEXT PRIMARY KEY, watermark TEXT, synced_at REAL, full_synced_at REAL)"
+        )
+        for table, spec in MIRROR_TABLES.items():
+            columns = ", ".join(f"{_quote(c)}" for c in spec["columns"])
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (id PRIMARY KEY, {columns}, data TEXT)"
+            )
+        conn.execute("CREATE INDEX IF NOT EXISTS tasklist_student ON tasklist (studentid)")
+        conn.execute("CREATE INDEX IF NOT EXISTS tasklist_topic ON tasklist (topicid)")
+        conn.execute("CREATE INDEX IF NOT EXISTS testlist_student ON testlist (studentid)")
+        conn.execute("CREATE INDEX IF NOT EXISTS testlist_topic ON testlist (topicid)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessionlist_created ON sessionlist (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS stdlist_created ON stdlist (createdat)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # Состояние синхронизации
+    def state(self, table: str) -> Dict[str, Any]:
+        row = self._connection().execute(
+            "SELECT watermark, synced_at, full_synced_at FROM mirror_state WHERE tbl = ?", (table,)
+        ).fetchone()
+        if row is None:
+            return {"watermark": None, "synced_at": 0.0, "full_synced_at": 0.0}
+        return {
+            "watermark": row["watermark"],
+            "synced_at": row["synced_at"] or 0.0,
+            "full_synced_at": row["full_synced_at"] or 0.0
+        }
+
+    def age_seconds(self) -> float:
+        """Возраст самой давно синхронизированной таблицы"""
+        oldest = min(self.state(table)["synced_at"] for table in MIRROR_TABLES)
+        return time.time() - oldest
+
+    def mark_synced(self, table: str, watermark: Optional[Any], full: bool = False) -> None:
+        now = time.time()
+        state = self.state(table)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO mirror_state (tbl, watermark, synced_at, full_synced_at) VALUES (?, ?, ?, ?)",
+            (
+                table,
+                str(watermark) if watermark is not None else state["watermark"],
+                now,
+                now if full else state["full_synced_at"]
+            )
+        )
+
+    # Запись
+    def upsert(self, table: str, rows: Iterable[Dict[str, Any]], replace_all: bool = False) -> int:
+        """Вставить или обновить строки по id; replace_all — заменить таблицу целиком"""
+        columns = MIRROR_TABLES[table]["columns"]
+        placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+        sql = (
+            f"INSERT OR REPLACE INTO {table} (id, {', '.join(_quote(c) for c in columns)}, data) "
+            f"VALUES ({placeholders})"
+        )
+        values = [
+            (self._value(row.get("id")), *[self._value(row.get(c)) for c in columns], json.dumps(row, default=str))
+            for row in rows
+        ]
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace_all:
+                conn.execute(f"DELETE FROM {table}")
+            conn.executemany(sql, values)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(values)
+
+    @staticmethod
+    def _value(value: Any) -> Any:
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, default=str)
+        return value
+
+    # Отчетные запросы
+    def students_page(self, start: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Страница студентов с количеством заданий и тестов"""
+        conn = self._connection()
+        rows = conn.execute(
+            """
+            SELECT s.id, s.fullname, s.tgid, s.isactive, s.createdat, s."Group",
+                   (SELECT COUNT(*) FROM tasklist t WHERE t.studentid = s.id) AS tasks_count,
+                   (SELECT COUNT(*) FROM testlist t WHERE t.studentid = s.id) AS tests_count
+            FROM stdlist s
+            ORDER BY s.createdat DESC
+            LIMIT ? OFFSET ?
+            """,
+            (limit, start)
+        ).fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM stdlist").fetchone()[0]
+        return [self._typed(dict(row)) for row in rows], total
+
+    def topics_page(self, start: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Страница тем с названием предмета и числом выполненных заданий/тестов"""
+        conn = self._connection()
+        rows = conn.execute(
+            """
+            SELECT tp.id, tp.topicname, tp.topicdesc, tp.isactive, tp.subjectid, tp.date_of_completion,
+                   json_extract(tp.data, '$.raglink') AS raglink,
+                   COALESCE(sb.subjectname, '') AS subjectname,
+                   (SELECT COUNT(*) FROM tasklist t WHERE t.topicid = tp.id)
+                   + (SELECT COUNT(*) FROM testlist t WHERE t.topicid = tp.id) AS completed_count
+            FROM topiclist tp
+            LEFT JOIN subjectlist sb ON sb.id = tp.subjectid
+            ORDER BY tp.id DESC
+            LIMIT ? OFFSET ?
+            """,
+            (limit, start)
+        ).fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM topiclist").fetchone()[0]
+        return [self._typed(dict(row)) for row in rows], total
+
+    def students_by_id(self, student_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """Строки stdlist по списку id (ключ — id строкой)"""
+        ids = [i for i in student_ids if i is not None]
+        result: Dict[str, Dict[str, Any]] = {}
+        conn = self._connection()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = conn.execute(
+                f"SELECT id, fullname, tgid, isactive, createdat, \"Group\" FROM stdlist "
+                f"WHERE id IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            ).fetchall()
+            for row in rows:
+                result[str(row["id"])] = self._typed(dict(row))
+        return result
+
+    def statistics(self, recent_limit: int = 10) -> Dict[str, Any]:
+        """Счетчики для главной панели и последние сессии с названием темы"""
+        conn = self._connection()
+        counts = conn.execute(
+            """
+            SELECT (SELECT COUNT(*) FROM stdlist) AS total_students,
+                   (SELECT COUNT(*) FROM stdlist WHERE isactive = 1) AS active_students,
+                   (SELECT COUNT(*) FROM topiclist WHERE isactive = 1) AS total_topics
+            """
+        ).fetchone()
+        recent = conn.execute(
+            """
+            SELECT s.id, s.tgid, s.mode, s.topicid, s.current_index, s.total, s.created_at,
+                   COALESCE(tp.topicname, '') AS topicname
+            FROM sessionlist s
+            LEFT JOIN topiclist tp ON tp.id = s.topicid
+            ORDER BY s.created_at DESC
+            LIMIT ?
+            """,
+            (recent_limit,)
+        ).fetchall()
+        return {
+            "total_students": counts["total_students"],
+            "active_students": counts["active_students"],
+            "total_topics": counts["total_topics"],
+            "recent_sessions": [self._typed(dict(row)) for row in recent]
+        }
+
+    @staticmethod
+    def _typed(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Вернуть bool для isactive (в SQLite хранится 0/1)"""
+        if "isactive" in row and row["isactive"] is not None:
+            row["isactive"] = bool(row["isactive"])
+        return row
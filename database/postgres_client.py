@@ -0,0 +1,263 @@
+import asyncio
+import json
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+from uuid import UUID
+
+from analytics.activity import parse_timestamp
+from database.supabase_client import SupabaseClient
+
+STUDENTS_PAGE_SQL = """
+SELECT s.id, s.fullname, s.tgid, s.isactive, s.createdat, s."Group",
+       (SELECT count(*) FROM tasklist t WHERE t.studentid = s.id) AS tasks_count,
+       (SELECT count(*) FROM testlist t WHERE t.studentid = s.id) AS tests_count,
+       (SELECT count(*) FROM stdlist) AS total
+FROM stdlist s
+ORDER BY s.createdat DESC
+LIMIT $1 OFFSET $2
+"""
+
+TOPICS_PAGE_SQL = """
+SELECT tp.id, tp.topicname, tp.topicdesc, tp.isactive, tp.subjectid, tp.date_of_completion, tp.raglink,
+       COALESCE(sb.subjectname, '') AS subjectname,
+       (SELECT count(*) FROM tasklist t WHERE t.topicid = tp.id)
+       + (SELECT count(*) FROM testlist t WHERE t.topicid = tp.id) AS completed_count,
+       (SELECT count(*) FROM topiclist) AS total
+FROM topiclist tp
+LEFT JOIN subjectlist sb ON sb.id = tp.subjectid
+ORDER BY tp.id DESC
+LIMIT $1 OFFSET $2
+"""
+
+SESSIONS_PAGE_SQL = """
+SELECT s.id, s.tgid, s.mode, s.topicid, s.total, s.current_index, s.created_at,
+       COALESCE(tp.topicname, '') AS topicname,
+       s.questions -> s.current_index AS current_question,
+       s.answers -> s.current_index AS current_answer,
+       (SELECT count(*) FROM sessionlist) AS total_count
+FROM sessionlist s
+LEFT JOIN topiclist tp ON tp.id = s.topicid
+ORDER BY s.created_at DESC
+LIMIT $1 OFFSET $2
+"""
+
+PROGRESS_SQL = """
+SELECT sp.studentid,
+       s.fullname, s.tgid, s.isactive, s.createdat, s."Group",
+       count(*) AS total_topics,
+       count(*) FILTER (WHERE sp.practice_done OR sp.test_done) AS completed_topics,
+       COALESCE(avg(sp.practice_score) FILTER (WHERE sp.practice_done AND sp.practice_score IS NOT NULL), 0)
+           AS practice_avg,
+       COALESCE(avg(sp.test_score) FILTER (WHERE sp.test_done AND sp.test_score IS NOT NULL), 0)
+           AS test_avg
+FROM student_progress sp
+LEFT JOIN stdlist s ON s.id = sp.studentid
+GROUP BY sp.studentid, s.id
+ORDER BY sp.studentid
+"""
+
+STATISTICS_SQL = """
+SELECT (SELECT count(*) FROM stdlist) AS total_students,
+       (SELECT count(*) FROM stdlist WHERE isactive) AS active_students,
+       (SELECT count(*) FROM topiclist WHERE isactive) AS total_topics,
+       (SELECT count(*) FROM sessionlist WHERE created_at >= now() - interval '24 hours') AS active_sessions,
+       (
+           SELECT COALESCE(json_agg(r), '[]'::json)
+           FROM (
+               SELECT s.id, s.tgid, s.mode, s.topicid, s.current_index, s.total, s.created_at,
+                      COALESCE(tp.topicname, '') AS topicname
+               FROM sessionlist s
+               LEFT JOIN topiclist tp ON tp.id = s.topicid
+               ORDER BY s.created_at DESC
+               LIMIT 10
+           ) r
+       ) AS recent_sessions
+"""
+
+TIMELINE_SQL = "SELECT student_timeline($1, $2::text::timestamptz, $3, $4) AS timeline"
+
+
+def _plain(value: Any) -> Any:
+    """Привести значения asyncpg к виду, в котором их отдает PostgREST"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _json_item(value: Optional[str]) -> str:
+    """Элемент jsonb-массива как строка (как str() от элемента в PostgREST-ветке)"""
+    if value is None:
+        return ""
+    return str(json.loads(value))
+
+
+class PostgresClient(SupabaseClient):
+    """Клиент с прямым подключением к Postgres через пул asyncpg.
+
+    Тяжелые отчеты (списки с именами и счетчиками, прогресс, статистика)
+    выполняются одним SQL-запросом каждый; остальные методы работают через
+    PostgREST, как в SupabaseClient. asyncpg готовит каждый запрос один раз
+    на соединение и переиспользует prepared statement из кэша соединения.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pool = None
+        self._pool_lock: Optional[asyncio.Lock] = None
+
+    async def pool(self):
+        if self._pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self._pool is None:
+                    import asyncpg
+
+                    if not self.settings.database_dsn:
+                        raise RuntimeError("database_backend=postgres требует database_dsn")
+                    self._pool = await asyncpg.create_pool(
+                        self.settings.database_dsn,
+                        min_size=self.settings.postgres_pool_min_size,
+                        max_size=self.settings.postgres_pool_max_size,
+                        statement_cache_size=self.settings.postgres_statement_cache_size,
+                        command_timeout=self.settings.backend_timeout_seconds
+                    )
+        return self._pool
+
+    async def connect(self) -> None:
+        await super().connect()
+        await self.pool()
+
+    async def close(self) -> None:
+        await super().close()
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _fetch(self, name: str, sql: str, *args: Any) -> List[Dict[str, Any]]:
+        """Выполнить SQL через пул под дедлайном, повторами и предохранителем"""
+        async def run() -> List[Dict[str, Any]]:
+            pool = await self.pool()
+            records = await pool.fetch(sql, *args)
+            return [{key: _plain(value) for key, value in record.items()} for record in records]
+
+        return await self.guard.call_async(f"pg:{name}", run)
+
+    async def _fetch_students(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Страница студентов со счетчиками заданий и тестов одним запросом"""
+        rows = await self._fetch("students", STUDENTS_PAGE_SQL, page_size, (page - 1) * page_size)
+        total = rows[0]["total"] if rows else await self._count("stdlist")
+        return {
+            "data": [self._format_student(row, row["tasks_count"] + row["tests_count"]) for row in rows],
+            "total": total,
+            "page": page,
+            "page_size": page_size
+        }
+
+    async def _fetch_topics(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Страница тем с предметом и числом выполнений одним запросом"""
+        rows = await self._fetch("topics", TOPICS_PAGE_SQL, page_size, (page - 1) * page_size)
+        total = rows[0]["total"] if rows else await self._count("topiclist")
+        return {
+            "data": [self._format_topic(row, row["subjectname"], row["completed_count"]) for row in rows],
+            "total": total,
+            "page": page,
+            "page_size": page_size
+        }
+
+    async def _fetch_sessions(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Страница сессий с названием темы и текущим вопросом одним запросом"""
+        rows = await self._fetch("sessions", SESSIONS_PAGE_SQL, page_size, (page - 1) * page_size)
+        total = rows[0]["total_count"] if rows else await self._count("sessionlist")
+        return {
+            "data": [
+                self._format_session(
+                    row, row["topicname"],
+                    _json_item(row["current_question"]),
+                    _json_item(row["current_answer"])
+                )
+                for row in rows
+            ],
+            "total": total,
+            "page": page,
+            "page_size": page_size
+        }
+
+    async def _fetch_student_progress(self) -> Dict[str, Any]:
+        """Прогресс студентов: агрегаты по студенту считает Postgres (GROUP BY)"""
+        rows = await self._fetch("progress", PROGRESS_SQL)
+
+        students_progress = []
+        active_count = 0
+        new_students = 0
+        week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+        for row in rows:
+            student = self._format_student(row, row["total_topics"])
+            practice_avg = float(row["practice_avg"])
+            test_avg = float(row["test_avg"])
+
+            if student["is_active"]:
+                active_count += 1
+            created_at = parse_timestamp(row["createdat"])
+            if created_at and created_at > week_ago:
+                new_students += 1
+
+            students_progress.append({
+                "id": row["studentid"],
+                "tgid": student["tgid"] or "",
+                "username": "",
+                "first_name": student["first_name"],
+                "last_name": student["last_name"],
+                "completed_topics": row["completed_topics"],
+                "total_topics": row["total_topics"],
+                "average_score": round((practice_avg + test_avg) / 2, 1) if practice_avg > 0 or test_avg > 0 else 0,
+                "last_activity": None,  # Нет поля последней активности
+                "is_active": student["is_active"],
+                "group": student["group"] or ""
+            })
+
+        # Как в PostgREST-ветке: доля завершенных тем от числа тем первого студента
+        topics_per_student = rows[0]["total_topics"] if rows else 0
+        completed_total = sum(row["completed_topics"] for row in rows)
+        avg_progress = completed_total / (len(rows) * topics_per_student) * 100 if topics_per_student else 0
+
+        return {
+            "average_progress": round(avg_progress, 1),
+            "active_students": active_count,
+            "completed_students": len([s for s in students_progress if s["completed_topics"] >= 3]),
+            # Завершили хотя бы 3 темы
+            "new_students": new_students,
+            "students": students_progress[:100],  # Ограничиваем для производительности
+            "total_students": len(students_progress)
+        }
+
+    async def _fetch_statistics(self) -> Dict[str, Any]:
+        """Статистика главной панели одним запросом"""
+        row = (await self._fetch("statistics", STATISTICS_SQL))[0]
+        recent = json.loads(row["recent_sessions"]) if isinstance(row["recent_sessions"], str) \
+            else row["recent_sessions"]
+        return {
+            "total_students": row["total_students"],
+            "active_students": row["active_students"],
+            "total_topics": row["total_topics"],
+            "active_sessions": row["active_sessions"],
+            "recent_sessions": [self._format_recent_session(session, session["topicname"]) for session in recent]
+        }
+
+    async def _fetch_student_timeline(
+            self,
+            student_id: int,
+            cursor_ts: Optional[str],
+            cursor_key: Optional[str],
+            limit: int
+    ) -> Dict[str, Any]:
+        """Страница ленты той же SQL-функцией, что и RPC в PostgREST-ветке"""
+        rows = await self._fetch("timeline", TIMELINE_SQL, student_id, cursor_ts, cursor_key, limit)
+        timeline = rows[0]["timeline"] if rows else None
+        return json.loads(timeline) if isinstance(timeline, str) else (timeline or {})
+
+    async def _count(self, table: str) -> int:
+        rows = await self._fetch(f"count:{table}", f"SELECT count(*) AS total FROM {table}")
+        return rows[0]["total"]
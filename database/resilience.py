@@ -0,0 +1,211 @@
+import asyncio
+import json
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from profiler import in_profiled_thread, profile_phase
+
+
+class BackendUnavailable(Exception):
+    """Бэкенд не ответил: таймаут, исчерпаны повторы или открыт предохранитель"""
+
+
+# Коды PostgREST "нет соединения с базой / пул исчерпан" (PGRST000-PGRST003)
+TRANSIENT_POSTGREST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+# Классы SQLSTATE: 08 — соединение, 53 — нехватка ресурсов, 57 — таймаут выражения/перезапуск
+TRANSIENT_SQLSTATE_CLASSES = ("08", "53", "57")
+# Ошибки клиента asyncpg без SQLSTATE: соединение закрыто или потеряно во время запроса
+# (DataError тоже наследует InterfaceError, но это ошибка аргументов запроса)
+TRANSIENT_ASYNCPG_ERRORS = {"InterfaceError", "ConnectionDoesNotExistError"}
+
+
+def is_transient(error: Exception) -> bool:
+    """Можно ли повторить запрос после такой ошибки.
+
+    Ошибки PostgREST с HTTP-кодом 4xx (нет строки, нарушение ограничения,
+    неверный запрос) повторять бессмысленно; сетевые ошибки, таймауты, 5xx,
+    перегрузка пула PostgREST и SQLSTATE классов 08/53/57 — можно. Ответ шлюза
+    502/503/504 приходит HTML-страницей, и postgrest-py падает на разборе JSON.
+    Ошибки asyncpg несут SQLSTATE в sqlstate, а потерю соединения сообщают
+    через InterfaceError.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, OSError, json.JSONDecodeError)):
+        return True
+    if type(error).__module__.startswith("asyncpg"):
+        sqlstate = getattr(error, "sqlstate", None)
+        if isinstance(sqlstate, str) and sqlstate:
+            return sqlstate.startswith(TRANSIENT_SQLSTATE_CLASSES)
+        return type(error).__name__ in TRANSIENT_ASYNCPG_ERRORS
+    code = getattr(error, "code", None)
+    if isinstance(code, str) and code:
+        if len(code) == 3 and code.isdigit():
+            return int(code) >= 500
+        if code in TRANSIENT_POSTGREST_CODES:
+            return True
+        if len(code) == 5:
+            return code.startswith(TRANSIENT_SQLSTATE_CLASSES)
+        # Остальные PGRSTxxx — ответ сервера по существу запроса, а не сбой
+        return False
+    return type(error).__module__.startswith(("httpx", "httpcore"))
+
+
+class CircuitBreaker:
+    """Предохранитель для одной таблицы/эндпоинта.
+
+    После failure_threshold подряд неудачных вызовов размыкается на
+    reset_seconds: вызовы сразу завершаются BackendUnavailable, не нагружая
+    Supabase. Затем пропускает один пробный вызов (half-open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Вызов завершился ошибкой запроса (4xx): счетчик не меняется, пробный вызов освобождается"""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class BackendGuard:
+    """Дедлайны, повторы с джиттером и предохранители для вызовов бэкенда"""
+
+    def __init__(
+            self,
+            timeout: float = 5.0,
+            retries: int = 2,
+            base_delay: float = 0.2,
+            failure_threshold: int = 5,
+            reset_seconds: float = 30.0,
+            max_concurrency: int = 16
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.base_delay = base_delay
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Ограничивает число потоков, одновременно ждущих Supabase
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(name, self.failure_threshold, self.reset_seconds)
+        return self.breakers[name]
+
+    async def call(self, name: str, fn: Callable[[], Any], idempotent: bool = True) -> Any:
+        """Выполнить блокирующий вызов fn в потоке с дедлайном"""
+        fn = in_profiled_thread(fn)
+        return await self.call_async(name, lambda: asyncio.to_thread(fn), idempotent=idempotent)
+
+    async def call_async(self, name: str, factory: Callable[[], Awaitable[Any]], idempotent: bool = True) -> Any:
+        """Выполнить корутину из factory с дедлайном.
+
+        Идемпотентные чтения повторяются до retries раз с паузой
+        random(0, base_delay * 2^attempt) ("full jitter").
+        """
+        with profile_phase("backend"):
+            return await self._call_async(name, factory, idempotent)
+
+    async def _call_async(self, name: str, factory: Callable[[], Awaitable[Any]], idempotent: bool) -> Any:
+        breaker = self.breaker(name)
+        attempts = self.retries + 1 if idempotent else 1
+        deadline = time.monotonic() + self.timeout * attempts
+
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise BackendUnavailable(f"{name}: предохранитель разомкнут")
+
+            remaining = deadline - time.monotonic()
+            try:
+                async with self._semaphore:
+                    result = await asyncio.wait_for(
+                        factory(),
+                        timeout=max(0.1, min(self.timeout, remaining))
+                    )
+            except Exception as e:
+                if not is_transient(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= attempts or time.monotonic() >= deadline:
+                    raise BackendUnavailable(f"{name}: {type(e).__name__}: {e}") from e
+                await asyncio.sleep(random.uniform(0, self.base_delay * 2 ** attempt))
+            except BaseException:
+                # Отмена вызова (CancelledError) не должна оставить пробный вызов занятым навсегда
+                breaker.release()
+                raise
+            else:
+                breaker.record_success()
+                return result
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            name: {"state": breaker.state, "failures": breaker.failures}
+            for name, breaker in self.breakers.items()
+        }
+
+
+class AdmissionController:
+    """Сброс нагрузки до того, как event loop захлебнется.
+
+    Запрос отклоняется (503), если уже обрабатывается max_in_flight
+    запросов или задержка event loop превысила max_loop_lag секунд.
+    """
+
+    def __init__(self, max_in_flight: int = 64, max_loop_lag: float = 0.5, probe_interval: float = 0.25):
+        self.max_in_flight = max_in_flight
+        self.max_loop_lag = max_loop_lag
+        self.probe_interval = probe_interval
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.shed_count = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.max_in_flight or self.loop_lag > self.max_loop_lag:
+            self.shed_count += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    async def monitor_loop_lag(self) -> None:
+        """Фоновая задача: насколько позже запланированного просыпается loop"""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.probe_interval)
+            self.loop_lag = max(0.0, time.monotonic() - started - self.probe_interval)
@@ -0,0 +1,80 @@
+-- Лента активности студента за один запрос: сессии, задания, тесты и прогресс по темам.
+-- Вызывается через PostgREST: POST /rest/v1/rpc/student_timeline
+-- Пагинация по курсору (ts, key): следующая страница — события строго старше последнего.
+-- У tasklist/testlist время берется из created_at или createdat, смотря что есть в таблице.
+
+CREATE OR REPLACE FUNCTION student_timeline(
+    p_student_id bigint,
+    p_cursor_ts timestamptz DEFAULT NULL,
+    p_cursor_key text DEFAULT NULL,
+    p_limit integer DEFAULT 20
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+WITH student AS (
+    SELECT id, tgid FROM stdlist WHERE id = p_student_id
+),
+events AS (
+    SELECT 'session:' || s.id::text AS key,
+           'session' AS kind,
+           COALESCE(s.created_at, 'epoch'::timestamptz) AS ts,
+           jsonb_build_object(
+               'id', s.id,
+               'mode', s.mode,
+               'topicid', s.topicid,
+               'topicname', tp.topicname,
+               'current_index', s.current_index,
+               'total', s.total
+           ) AS data
+    FROM sessionlist s
+    JOIN student st ON s.tgid = st.tgid
+    LEFT JOIN topiclist tp ON tp.id = s.topicid
+
+    UNION ALL
+
+    SELECT 'task:' || t.id::text,
+           'task',
+           COALESCE((to_jsonb(t) ->> 'created_at')::timestamptz,
+                    (to_jsonb(t) ->> 'createdat')::timestamptz,
+                    'epoch'::timestamptz),
+           to_jsonb(t) || jsonb_build_object('topicname', tp.topicname)
+    FROM tasklist t
+    LEFT JOIN topiclist tp ON tp.id = t.topicid
+    WHERE t.studentid = p_student_id
+
+    UNION ALL
+
+    SELECT 'test:' || t.id::text,
+           'test',
+           COALESCE((to_jsonb(t) ->> 'created_at')::timestamptz,
+                    (to_jsonb(t) ->> 'createdat')::timestamptz,
+                    'epoch'::timestamptz),
+           to_jsonb(t) || jsonb_build_object('topicname', tp.topicname)
+    FROM testlist t
+    LEFT JOIN topiclist tp ON tp.id = t.topicid
+    WHERE t.studentid = p_student_id
+),
+page AS (
+    SELECT *
+    FROM events
+    WHERE p_cursor_ts IS NULL OR (ts, key) < (p_cursor_ts, p_cursor_key)
+    ORDER BY ts DESC, key DESC
+    LIMIT p_limit + 1
+)
+SELECT jsonb_build_object(
+    'events', COALESCE(
+        (SELECT jsonb_agg(jsonb_build_object('key', key, 'kind', kind, 'ts', ts, 'data', data)
+                          ORDER BY ts DESC, key DESC)
+         FROM page),
+        '[]'::jsonb
+    ),
+    'progress', CASE WHEN p_cursor_ts IS NULL THEN COALESCE(
+        (SELECT jsonb_agg(to_jsonb(sp) ORDER BY sp.topicid)
+         FROM student_progress sp
+         WHERE sp.studentid = p_student_id),
+        '[]'::jsonb
+    ) END
+);
+$$;
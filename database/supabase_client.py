@@ -1,106 +1,307 @@
-from supabase import create_client, Client
-from config import settings
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+import asyncio
+import base64
+import json
+import time
+from config import Settings, get_settings
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, AsyncIterator, TYPE_CHECKING
+from datetime import datetime, timedelta, timezone
+
+from analytics.activity import SessionActivity, parse_timestamp
+from database.cache import CacheBackend, create_cache
+from database.mirror import LocalMirror, MIRROR_TABLES
+from database.resilience import BackendGuard, BackendUnavailable
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from analytics.questions import QuestionAnalytics
 
 
 class SupabaseClient:
+    """Клиент Supabase.
+
+    Клиент, кэш и бакеты активности создаются при первом обращении:
+    импорт модуля не читает настройки и не открывает соединений,
+    а прогрев выполняется в lifespan приложения (см. main.py).
+    """
+
     def __init__(self):
-        self.client: Client = create_client(
-            settings.supabase_url,
-            settings.supabase_key
-        )
+        self._client: Optional["Client"] = None
+        self._cache: Optional[CacheBackend] = None
+        self._activity: Optional[SessionActivity] = None
+        self._guard: Optional[BackendGuard] = None
+        self._mirror: Optional[LocalMirror] = None
+        self._questions: Optional["QuestionAnalytics"] = None
+        self._mirror_lock: Optional[asyncio.Lock] = None
+        self._mirror_resync: Optional[asyncio.Task] = None
+        self._activity_lock: Optional[asyncio.Lock] = None
+        self._questions_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def settings(self) -> Settings:
+        return get_settings()
+
+    @property
+    def client(self) -> "Client":
+        if self._client is None:
+            from supabase import create_client
+            from supabase.lib.client_options import ClientOptions
+
+            # HTTP-таймаут равен дедлайну BackendGuard: иначе после дедлайна
+            # запрос продолжает занимать поток пула до таймаута httpx по умолчанию
+            self._client = create_client(
+                self.settings.supabase_url,
+                self.settings.supabase_key,
+                options=ClientOptions(postgrest_client_timeout=self.settings.backend_timeout_seconds)
+            )
+        return self._client
+
+    @property
+    def cache(self) -> CacheBackend:
+        if self._cache is None:
+            self._cache = create_cache(self.settings.cache_backend, self.settings.cache_url)
+        return self._cache
+
+    @property
+    def activity(self) -> SessionActivity:
+        if self._activity is None:
+            self._activity = SessionActivity(
+                hourly_retention_hours=self.settings.activity_hourly_retention_hours,
+                daily_retention_days=self.settings.activity_daily_retention_days
+            )
+        return self._activity
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._client is not None
+
+    @property
+    def guard(self) -> BackendGuard:
+        if self._guard is None:
+            self._guard = BackendGuard(
+                timeout=self.settings.backend_timeout_seconds,
+                retries=self.settings.backend_retries,
+                base_delay=self.settings.backend_retry_base_delay,
+                failure_threshold=self.settings.breaker_failure_threshold,
+                reset_seconds=self.settings.breaker_reset_seconds,
+                max_concurrency=self.settings.backend_max_concurrency
+            )
+        return self._guard
+
+    @property
+    def questions(self) -> "QuestionAnalytics":
+        if self._questions is None:
+            # NumPy импортируется только при первом обращении к аналитике
+            from analytics.questions import QuestionAnalytics
+
+            self._questions = QuestionAnalytics(settle_hours=self.settings.question_analytics_settle_hours)
+        return self._questions
+
+    @property
+    def mirror(self) -> Optional[LocalMirror]:
+        if self._mirror is None and self.settings.mirror_enabled:
+            self._mirror = LocalMirror(self.settings.mirror_path)
+        return self._mirror
+
+    # Доступ к бэкенду
+    async def connect(self) -> None:
+        """Создать клиент заранее; импорт supabase и создание клиента блокируют, поэтому в потоке"""
+        await asyncio.to_thread(lambda: self.client)
+
+    async def close(self) -> None:
+        """Остановить фоновую пересинхронизацию зеркала (у PostgREST-клиента постоянных соединений нет)"""
+        if self._mirror_resync is not None:
+            self._mirror_resync.cancel()
+
+    async def _execute(self, table: str, query: Any, idempotent: bool = True) -> Any:
+        """Выполнить запрос PostgREST с дедлайном, повторами и предохранителем таблицы"""
+        return await self.guard.call(table, query.execute, idempotent=idempotent)
+
+    async def _fetch_row(self, table: str, columns: str, row_id: Any) -> Dict[str, Any]:
+        """Получить одну строку по id; пустой словарь, если строки нет"""
+        query = self.client.table(table) \
+            .select(columns) \
+            .eq("id", row_id) \
+            .limit(1)
+        response = await self._execute(table, query)
+        return response.data[0] if response.data else {}
+
+    async def _cached(
+            self,
+            namespace: str,
+            key: str,
+            loader: Callable[[], Awaitable[Dict[str, Any]]],
+            fallback: Dict[str, Any],
+            ttl: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Прочитать через кэш.
+
+        Каждый удачный результат сохраняется как "последний хороший". Если
+        бэкенд недоступен, возвращается он с пометкой stale=True, а если его
+        нет — fallback с пометкой unavailable=True (вместо тихих нулей).
+        """
+        async def load_and_remember() -> Dict[str, Any]:
+            value = await loader()
+            try:
+                await self.cache.set(f"last_good:{namespace}", key, value, self.settings.stale_ttl_seconds)
+            except Exception as e:
+                print(f"Error in {namespace} (cache): {e}")
+            return value
 
-    # Студенты
-    async def get_students(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
-        """Получить список студентов с пагинацией"""
         try:
-            start = (page - 1) * page_size
-            end = start + page_size - 1
-
-            response = self.client.table("stdlist") \
-                .select("id, fullname, tgid, isactive, createdat, \"Group\"") \
-                .range(start, end) \
-                .order("createdat", desc=True) \
-                .execute()
+            return await self._get_or_load(
+                namespace, key, load_and_remember,
+                ttl or self.settings.cache_ttl_seconds
+            )
+        except Exception as e:
+            print(f"Error in {namespace}: {e}")
 
-            count = self.client.table("stdlist") \
-                .select("*", count="exact") \
-                .execute()
+        try:
+            last_good = await self.cache.get(f"last_good:{namespace}", key)
+        except Exception as e:
+            print(f"Error in {namespace} (last good): {e}")
+            last_good = None
+
+        if last_good is not None:
+            return {**last_good, "stale": True}
+        return {**fallback, "unavailable": True}
+
+    async def _get_or_load(
+            self,
+            namespace: str,
+            key: str,
+            loader: Callable[[], Awaitable[Dict[str, Any]]],
+            ttl: int
+    ) -> Dict[str, Any]:
+        """cache.get_or_load, который при недоступном кэше (Redis, SQLite) идет прямо в бэкенд.
+
+        Ошибки загрузчика пробрасываются как есть: это сбой бэкенда, а не кэша.
+        """
+        loaded: List[Dict[str, Any]] = []
+        failures: List[Exception] = []
+
+        async def tracked() -> Dict[str, Any]:
+            try:
+                value = await loader()
+            except Exception as e:
+                failures.append(e)
+                raise
+            loaded.append(value)
+            return value
 
-            # Форматируем данные для шаблона
-            formatted_students = []
-            for student in response.data:
-                # Парсим имя из fullname
-                fullname = student.get("fullname", "").strip()
-                first_name = ""
-                last_name = ""
+        try:
+            return await self.cache.get_or_load(namespace, key, tracked, ttl)
+        except Exception as e:
+            if failures:
+                raise failures[0]
+            print(f"Error in {namespace} (cache): {e}")
+            if loaded:
+                # Значение загружено, не удалось только сохранить его
+                return loaded[0]
+        return await loader()
 
-                if fullname:
-                    parts = fullname.split()
-                    if len(parts) >= 2:
-                        first_name = parts[0]
-                        last_name = " ".join(parts[1:])
-                    else:
-                        first_name = fullname
+    # Студенты
+    async def get_students(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Получить список студентов с пагинацией"""
+        return await self._cached(
+            "students", f"{page}:{page_size}",
+            lambda: self._fetch_students(page, page_size),
+            fallback={"data": [], "total": 0, "page": page, "page_size": page_size}
+        )
 
-                # Получаем количество тем (из tasklist и testlist)
-                student_id = student.get("id")
-                tasks_count = 0
-                tests_count = 0
-
-                try:
-                    tasks_response = self.client.table("tasklist") \
-                        .select("*", count="exact") \
-                        .eq("studentid", student_id) \
-                        .execute()
-                    tasks_count = tasks_response.count or 0
-                except:
-                    pass
-
-                try:
-                    tests_response = self.client.table("testlist") \
-                        .select("*", count="exact") \
-                        .eq("studentid", student_id) \
-                        .execute()
-                    tests_count = tests_response.count or 0
-                except:
-                    pass
-
-                formatted_students.append({
-                    "id": student_id,
-                    "tgid": student.get("tgid", ""),
-                    "username": "",  # Нет поля username в таблице
-                    "first_name": first_name,
-                    "last_name": last_name,
-                    "level": student.get("Group", ""),  # Используем "Group" как уровень
-                    "topics_count": tasks_count + tests_count,
-                    "is_active": bool(student.get("isactive", True)),
-                    "created_at": student.get("createdat"),
-                    "fullname": fullname,
-                    "group": student.get("Group", "")
-                })
+    async def _fetch_students(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Загрузить страницу студентов из Supabase (без кэша)"""
+        start = (page - 1) * page_size
+        end = start + page_size - 1
 
+        mirror = await self._fresh_mirror()
+        if mirror is not None:
+            rows, total = await asyncio.to_thread(mirror.students_page, start, page_size)
             return {
-                "data": formatted_students,
-                "total": count.count if hasattr(count, 'count') else len(response.data),
+                "data": [self._format_student(row, row["tasks_count"] + row["tests_count"]) for row in rows],
+                "total": total,
                 "page": page,
                 "page_size": page_size
             }
-        except Exception as e:
-            print(f"Error in get_students: {e}")
-            return {"data": [], "total": 0, "page": page, "page_size": page_size}
+
+        query = self.client.table("stdlist") \
+            .select("id, fullname, tgid, isactive, createdat, \"Group\"") \
+            .range(start, end) \
+            .order("createdat", desc=True)
+        response = await self._execute("stdlist", query)
+
+        query = self.client.table("stdlist") \
+            .select("*", count="exact")
+        count = await self._execute("stdlist", query)
+
+        # Форматируем данные для шаблона
+        formatted_students = []
+        for student in response.data:
+            # Получаем количество тем (из tasklist и testlist)
+            student_id = student.get("id")
+            tasks_count = 0
+            tests_count = 0
+
+            query = self.client.table("tasklist") \
+                .select("*", count="exact") \
+                .eq("studentid", student_id)
+            tasks_response = await self._execute("tasklist", query)
+            tasks_count = tasks_response.count or 0
+
+            query = self.client.table("testlist") \
+                .select("*", count="exact") \
+                .eq("studentid", student_id)
+            tests_response = await self._execute("testlist", query)
+            tests_count = tests_response.count or 0
+
+            formatted_students.append(self._format_student(student, tasks_count + tests_count))
+
+        return {
+            "data": formatted_students,
+            "total": count.count if hasattr(count, 'count') else len(response.data),
+            "page": page,
+            "page_size": page_size
+        }
+
+    @staticmethod
+    def _format_student(student: Dict[str, Any], topics_count: int) -> Dict[str, Any]:
+        """Строка stdlist в формате шаблона students.html"""
+        # Парсим имя из fullname
+        fullname = (student.get("fullname") or "").strip()
+        first_name = ""
+        last_name = ""
+
+        if fullname:
+            parts = fullname.split()
+            if len(parts) >= 2:
+                first_name = parts[0]
+                last_name = " ".join(parts[1:])
+            else:
+                first_name = fullname
+
+        return {
+            "id": student.get("id"),
+            "tgid": student.get("tgid", ""),
+            "username": "",  # Нет поля username в таблице
+            "first_name": first_name,
+            "last_name": last_name,
+            "level": student.get("Group", ""),  # Используем "Group" как уровень
+            "topics_count": topics_count,
+            "is_active": bool(student.get("isactive", True)),
+            "created_at": student.get("createdat"),
+            "fullname": fullname,
+            "group": student.get("Group", "")
+        }
 
     async def get_student_by_id(self, student_id: int) -> Optional[Dict[str, Any]]:
         """Получить студента по ID"""
         try:
-            response = self.client.table("stdlist") \
+            query = self.client.table("stdlist") \
                 .select("id, fullname, tgid, isactive, createdat, \"Group\"") \
                 .eq("id", student_id) \
-                .single() \
-                .execute()
+                .limit(1)
+            response = await self._execute("stdlist", query)
 
-            student = response.data
+            student = response.data[0] if response.data else None
             if student:
                 # Парсим имя
                 fullname = student.get("fullname", "").strip()
@@ -126,319 +327,259 @@ class SupabaseClient:
                     "created_at": student.get("createdat")
                 }
             return None
+        except BackendUnavailable:
+            # Недоступность бэкенда — не "студент не найден": main.py ответит 503
+            raise
         except Exception as e:
             print(f"Error in get_student_by_id: {e}")
             return None
 
+    async def update_student(self, student_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Обновить студента и сбросить зависящие от него кэши во всех воркерах"""
+        allowed = {"fullname", "tgid", "isactive", "Group"}
+        payload = {k: v for k, v in data.items() if k in allowed}
+        if not payload:
+            return await self.get_student_by_id(student_id)
+
+        query = self.client.table("stdlist") \
+            .update(payload) \
+            .eq("id", student_id)
+        response = await self._execute("stdlist", query, idempotent=False)
+
+        if self.mirror is not None and response.data:
+            await asyncio.to_thread(self.mirror.upsert, "stdlist", response.data)
+
+        for namespace in ("students", "progress", "statistics", "cohorts", "timeline"):
+            await self.cache.invalidate(namespace)
+
+        return response.data[0] if response.data else None
+
+    # Лента активности студента
+    async def get_student_timeline(
+            self,
+            student_id: int,
+            cursor: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Сессии, задания и тесты студента по времени (новые сверху) и прогресс по темам.
+
+        Страница собирается на стороне базы одним вызовом (RPC student_timeline,
+        см. database/sql/student_timeline.sql). Пагинация по курсору: next_cursor
+        указывает на последнее событие страницы, прогресс отдается только на первой.
+        """
+        limit = max(1, min(limit or self.settings.timeline_page_size, self.settings.timeline_max_page_size))
+        cursor_ts, cursor_key = decode_timeline_cursor(cursor)
+
+        async def load() -> Dict[str, Any]:
+            payload = await self._fetch_student_timeline(student_id, cursor_ts, cursor_key, limit)
+            events = payload.get("events") or []
+            page = events[:limit]
+            return {
+                "student_id": student_id,
+                "events": page,
+                "progress": payload.get("progress"),
+                "next_cursor": encode_timeline_cursor(page[-1]) if len(events) > limit else None
+            }
+
+        return await self._cached(
+            "timeline", f"{student_id}:{cursor or ''}:{limit}",
+            load,
+            fallback={"student_id": student_id, "events": [], "progress": None, "next_cursor": None}
+        )
+
+    async def _fetch_student_timeline(
+            self,
+            student_id: int,
+            cursor_ts: Optional[str],
+            cursor_key: Optional[str],
+            limit: int
+    ) -> Dict[str, Any]:
+        """Страница ленты (limit + 1 событие, чтобы понять, есть ли следующая)"""
+        query = self.client.rpc("student_timeline", {
+            "p_student_id": student_id,
+            "p_cursor_ts": cursor_ts,
+            "p_cursor_key": cursor_key,
+            "p_limit": limit
+        })
+        response = await self._execute("rpc:student_timeline", query)
+        return response.data or {}
+
     # Темы
     async def get_topics(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
         """Получить список тем с пагинацией"""
-        try:
-            start = (page - 1) * page_size
-            end = start + page_size - 1
-
-            response = self.client.table("topiclist") \
-                .select("id, topicname, topicdesc, isactive, subjectid, date_of_completion") \
-                .range(start, end) \
-                .order("id", desc=True) \
-                .execute()
+        return await self._cached(
+            "topics", f"{page}:{page_size}",
+            lambda: self._fetch_topics(page, page_size),
+            fallback={"data": [], "total": 0, "page": page, "page_size": page_size}
+        )
 
-            count = self.client.table("topiclist") \
-                .select("*", count="exact") \
-                .execute()
-
-            # Форматируем данные для шаблона
-            formatted_data = []
-            for topic in response.data:
-                # Получаем название предмета
-                subject_name = ""
-                subject_id = topic.get("subjectid")
-                if subject_id:
-                    try:
-                        subject_response = self.client.table("subjectlist") \
-                            .select("subjectname") \
-                            .eq("id", subject_id) \
-                            .single() \
-                            .execute()
-                        subject_name = subject_response.data.get("subjectname", "")
-                    except:
-                        pass
-
-                # Считаем количество выполненных заданий
-                topic_id = topic.get("id")
-                completed_count = 0
-
-                try:
-                    tasks_response = self.client.table("tasklist") \
-                        .select("*", count="exact") \
-                        .eq("topicid", topic_id) \
-                        .execute()
-                    completed_count += tasks_response.count or 0
-                except:
-                    pass
-
-                try:
-                    tests_response = self.client.table("testlist") \
-                        .select("*", count="exact") \
-                        .eq("topicid", topic_id) \
-                        .execute()
-                    completed_count += tests_response.count or 0
-                except:
-                    pass
-
-                formatted_data.append({
-                    "id": topic_id,
-                    "title": topic.get("topicname", "Без названия"),
-                    "description": topic.get("topicdesc", ""),
-                    "level": "beginner",  # По умолчанию
-                    "topic_type": "learning",
-                    "language": "ru",
-                    "subject": subject_name,
-                    "questions_count": 10,  # По умолчанию
-                    "completed_count": completed_count,
-                    "is_active": bool(topic.get("isactive", True)),
-                    "created_at": topic.get("date_of_completion"),  # Используем date_of_completion
-                    "raglink": topic.get("raglink", "")
-                })
+    async def _fetch_topics(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Загрузить страницу тем из Supabase (без кэша)"""
+        start = (page - 1) * page_size
+        end = start + page_size - 1
 
+        mirror = await self._fresh_mirror()
+        if mirror is not None:
+            rows, total = await asyncio.to_thread(mirror.topics_page, start, page_size)
             return {
-                "data": formatted_data,
-                "total": count.count if hasattr(count, 'count') else len(response.data),
+                "data": [self._format_topic(row, row["subjectname"], row["completed_count"]) for row in rows],
+                "total": total,
                 "page": page,
                 "page_size": page_size
             }
-        except Exception as e:
-            print(f"Error in get_topics: {e}")
-            return {"data": [], "total": 0, "page": page, "page_size": page_size}
+
+        query = self.client.table("topiclist") \
+            .select("id, topicname, topicdesc, isactive, subjectid, date_of_completion") \
+            .range(start, end) \
+            .order("id", desc=True)
+        response = await self._execute("topiclist", query)
+
+        query = self.client.table("topiclist") \
+            .select("*", count="exact")
+        count = await self._execute("topiclist", query)
+
+        # Форматируем данные для шаблона
+        formatted_data = []
+        for topic in response.data:
+            # Получаем название предмета
+            subject_name = ""
+            subject_id = topic.get("subjectid")
+            if subject_id:
+                subject = await self._fetch_row("subjectlist", "subjectname", subject_id)
+                subject_name = subject.get("subjectname", "")
+
+            # Считаем количество выполненных заданий
+            topic_id = topic.get("id")
+            completed_count = 0
+
+            query = self.client.table("tasklist") \
+                .select("*", count="exact") \
+                .eq("topicid", topic_id)
+            tasks_response = await self._execute("tasklist", query)
+            completed_count += tasks_response.count or 0
+
+            query = self.client.table("testlist") \
+                .select("*", count="exact") \
+                .eq("topicid", topic_id)
+            tests_response = await self._execute("testlist", query)
+            completed_count += tests_response.count or 0
+
+            formatted_data.append(self._format_topic(topic, subject_name, completed_count))
+
+        return {
+            "data": formatted_data,
+            "total": count.count if hasattr(count, 'count') else len(response.data),
+            "page": page,
+            "page_size": page_size
+        }
+
+    @staticmethod
+    def _format_topic(topic: Dict[str, Any], subject_name: str, completed_count: int) -> Dict[str, Any]:
+        """Строка topiclist в формате шаблона topics.html"""
+        return {
+            "id": topic.get("id"),
+            "title": topic.get("topicname", "Без названия"),
+            "description": topic.get("topicdesc", ""),
+            "level": "beginner",  # По умолчанию
+            "topic_type": "learning",
+            "language": "ru",
+            "subject": subject_name,
+            "questions_count": 10,  # По умолчанию
+            "completed_count": completed_count,
+            "is_active": bool(topic.get("isactive", True)),
+            "created_at": topic.get("date_of_completion"),  # Используем date_of_completion
+            "raglink": topic.get("raglink", "")
+        }
 
     # Сессии
     async def get_sessions(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
         """Получить список сессий"""
-        try:
-            start = (page - 1) * page_size
-            end = start + page_size - 1
-
-            response = self.client.table("sessionlist") \
-                .select("id, tgid, mode, topicid, total, current_index, created_at, questions, answers") \
-                .range(start, end) \
-                .order("created_at", desc=True) \
-                .execute()
+        return await self._cached(
+            "sessions", f"{page}:{page_size}",
+            lambda: self._fetch_sessions(page, page_size),
+            fallback={"data": [], "total": 0, "page": page, "page_size": page_size}
+        )
 
-            count = self.client.table("sessionlist") \
-                .select("*", count="exact") \
-                .execute()
-
-            # Форматируем данные для шаблона
-            formatted_data = []
-            for session in response.data:
-                # Получаем тему
-                topic_name = ""
-                topic_id = session.get("topicid")
-                if topic_id:
-                    try:
-                        topic_response = self.client.table("topiclist") \
-                            .select("topicname") \
-                            .eq("id", topic_id) \
-                            .single() \
-                            .execute()
-                        topic_name = topic_response.data.get("topicname", "")
-                    except:
-                        topic_name = f"Тема {topic_id}"
-
-                # Получаем текущий вопрос и ответ
-                questions = session.get("questions", [])
-                answers = session.get("answers", [])
-                current_index = session.get("current_index", 0)
-
-                current_question = ""
-                current_answer = ""
-
-                if isinstance(questions, list) and current_index < len(questions):
-                    current_question = str(questions[current_index])
-
-                if isinstance(answers, list) and current_index < len(answers):
-                    current_answer = str(answers[current_index])
-
-                formatted_data.append({
-                    "id": session.get("id", ""),
-                    "tgid": session.get("tgid", ""),
-                    "mode": session.get("mode", "learning"),
-                    "topicid": topic_id,
-                    "topic_name": topic_name,
-                    "current_question": current_question,
-                    "current_answer": current_answer,
-                    "score": None,  # В sessionlist нет поля score
-                    "current_index": current_index,
-                    "total": session.get("total", 10),
-                    "created_at": session.get("created_at"),
-                    "is_active": True  # Все сессии активны (нет поля is_active)
-                })
-
-            return {
-                "data": formatted_data,
-                "total": count.count if hasattr(count, 'count') else len(response.data),
-                "page": page,
-                "page_size": page_size
-            }
-        except Exception as e:
-            print(f"Error in get_sessions: {e}")
-            return {"data": [], "total": 0, "page": page, "page_size": page_size}
+    async def _fetch_sessions(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Загрузить страницу сессий из Supabase (без кэша)"""
+        start = (page - 1) * page_size
+        end = start + page_size - 1
+
+        query = self.client.table("sessionlist") \
+            .select("id, tgid, mode, topicid, total, current_index, created_at, questions, answers") \
+            .range(start, end) \
+            .order("created_at", desc=True)
+        response = await self._execute("sessionlist", query)
+
+        query = self.client.table("sessionlist") \
+            .select("*", count="exact")
+        count = await self._execute("sessionlist", query)
+
+        # Форматируем данные для шаблона
+        formatted_data = []
+        for session in response.data:
+            # Получаем тему
+            topic_name = ""
+            topic_id = session.get("topicid")
+            if topic_id:
+                topic = await self._fetch_row("topiclist", "topicname", topic_id)
+                topic_name = topic.get("topicname", "")
+
+            # Получаем текущий вопрос и ответ
+            questions = session.get("questions", [])
+            answers = session.get("answers", [])
+            current_index = session.get("current_index", 0)
+
+            current_question = ""
+            current_answer = ""
+
+            if isinstance(questions, list) and current_index < len(questions):
+                current_question = str(questions[current_index])
+
+            if isinstance(answers, list) and current_index < len(answers):
+                current_answer = str(answers[current_index])
+
+            formatted_data.append(
+                self._format_session(session, topic_name, current_question, current_answer)
+            )
+
+        return {
+            "data": formatted_data,
+            "total": count.count if hasattr(count, 'count') else len(response.data),
+            "page": page,
+            "page_size": page_size
+        }
+
+    @staticmethod
+    def _format_session(
+            session: Dict[str, Any],
+            topic_name: str,
+            current_question: str,
+            current_answer: str
+    ) -> Dict[str, Any]:
+        """Строка sessionlist в формате шаблона sessions.html"""
+        return {
+            "id": session.get("id", ""),
+            "tgid": session.get("tgid", ""),
+            "mode": session.get("mode", "learning"),
+            "topicid": session.get("topicid"),
+            "topic_name": topic_name,
+            "current_question": current_question,
+            "current_answer": current_answer,
+            "score": None,  # В sessionlist нет поля score
+            "current_index": session.get("current_index", 0),
+            "total": session.get("total", 10),
+            "created_at": session.get("created_at"),
+            "is_active": True  # Все сессии активны (нет поля is_active)
+        }
 
     # Прогресс студентов
     async def get_student_progress(self) -> Dict[str, Any]:
         """Получить прогресс студентов из view student_progress"""
-        try:
-            # Используем готовый view
-            response = self.client.table("student_progress") \
-                .select("*") \
-                .execute()
-
-            progress_data = response.data
-
-            # Группируем по студентам
-            students_dict = {}
-            for row in progress_data:
-                student_id = row.get("studentid")
-                if student_id not in students_dict:
-                    # Получаем доп. информацию о студенте
-                    student_info = {}
-                    try:
-                        student_response = self.client.table("stdlist") \
-                            .select("fullname, tgid, isactive, createdat, \"Group\"") \
-                            .eq("id", student_id) \
-                            .single() \
-                            .execute()
-                        student_info = student_response.data
-                    except:
-                        pass
-
-                    # Парсим имя
-                    fullname = student_info.get("fullname", "").strip()
-                    first_name = ""
-                    last_name = ""
-
-                    if fullname:
-                        parts = fullname.split()
-                        if len(parts) >= 2:
-                            first_name = parts[0]
-                            last_name = " ".join(parts[1:])
-                        else:
-                            first_name = fullname
-
-                    students_dict[student_id] = {
-                        "id": student_id,
-                        "tgid": student_info.get("tgid", ""),
-                        "fullname": fullname,
-                        "first_name": first_name,
-                        "last_name": last_name,
-                        "group": student_info.get("Group", ""),
-                        "is_active": bool(student_info.get("isactive", True)),
-                        "topics": [],
-                        "completed_count": 0,
-                        "practice_score_avg": 0,
-                        "test_score_avg": 0
-                    }
-
-                # Добавляем тему
-                students_dict[student_id]["topics"].append({
-                    "topicid": row.get("topicid"),
-                    "topicname": row.get("topicname"),
-                    "practice_done": row.get("practice_done", False),
-                    "practice_score": row.get("practice_score"),
-                    "test_done": row.get("test_done", False),
-                    "test_score": row.get("test_score")
-                })
-
-            # Считаем статистику для каждого студента
-            students_progress = []
-            practice_scores = []
-            test_scores = []
-            completed_counts = []
-            active_count = 0
-
-            for student in students_dict.values():
-                topics = student["topics"]
-
-                # Считаем выполненные практики и тесты
-                practice_done = [t for t in topics if t["practice_done"]]
-                test_done = [t for t in topics if t["test_done"]]
-
-                completed_topics = len([t for t in topics if t["practice_done"] or t["test_done"]])
-                student["completed_count"] = completed_topics
-                completed_counts.append(completed_topics)
-
-                # Считаем средние баллы
-                practice_scores_student = [t["practice_score"] for t in practice_done if
-                                           t["practice_score"] is not None]
-                test_scores_student = [t["test_score"] for t in test_done if t["test_score"] is not None]
-
-                practice_avg = sum(practice_scores_student) / len(
-                    practice_scores_student) if practice_scores_student else 0
-                test_avg = sum(test_scores_student) / len(test_scores_student) if test_scores_student else 0
-
-                student["practice_score_avg"] = practice_avg
-                student["test_score_avg"] = test_avg
-
-                # Общие средние
-                practice_scores.extend(practice_scores_student)
-                test_scores.extend(test_scores_student)
-
-                # Активен ли студент
-                if student["is_active"]:
-                    active_count += 1
-
-                # Формируем для шаблона
-                students_progress.append({
-                    "id": student["id"],
-                    "tgid": student["tgid"],
-                    "username": "",
-                    "first_name": student["first_name"],
-                    "last_name": student["last_name"],
-                    "completed_topics": completed_topics,
-                    "total_topics": len(topics),
-                    "average_score": round((practice_avg + test_avg) / 2, 1) if practice_avg > 0 or test_avg > 0 else 0,
-                    "last_activity": None,  # Нет поля последней активности
-                    "is_active": student["is_active"],
-                    "group": student["group"]
-                })
-
-            # Считаем общую статистику
-            avg_progress = sum(completed_counts) / (len(completed_counts) * len(
-                students_dict[list(students_dict.keys())[0]]["topics"])) * 100 if students_dict else 0
-
-            # Новые студенты (за последние 7 дней)
-            week_ago = datetime.now() - timedelta(days=7)
-            new_students = 0
-
-            for student_id in students_dict.keys():
-                try:
-                    student_response = self.client.table("stdlist") \
-                        .select("createdat") \
-                        .eq("id", student_id) \
-                        .single() \
-                        .execute()
-
-                    created_at = student_response.data.get("createdat")
-                    if created_at:
-                        dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                        if dt > week_ago:
-                            new_students += 1
-                except:
-                    pass
-
-            return {
-                "average_progress": round(avg_progress, 1),
-                "active_students": active_count,
-                "completed_students": len([s for s in students_progress if s["completed_topics"] >= 3]),
-                # Завершили хотя бы 3 темы
-                "new_students": new_students,
-                "students": students_progress[:100],  # Ограничиваем для производительности
-                "total_students": len(students_progress)
-            }
-
-        except Exception as e:
-            print(f"Error in get_student_progress: {e}")
-            return {
+        return await self._cached(
+            "progress", "all",
+            lambda: self._fetch_student_progress(),
+            fallback={
                 "average_progress": 0,
                 "active_students": 0,
                 "completed_students": 0,
@@ -446,95 +587,653 @@ class SupabaseClient:
                 "students": [],
                 "total_students": 0
             }
+        )
 
-    # Статистика
-    async def get_statistics(self) -> Dict[str, Any]:
-        """Получить статистику по системе"""
-        try:
-            # Количество студентов
-            students_response = self.client.table("stdlist") \
-                .select("*", count="exact") \
-                .execute()
-
-            total_students = students_response.count if hasattr(students_response, 'count') else 0
+    async def _fetch_student_progress(self) -> Dict[str, Any]:
+        """Загрузить прогресс студентов из view student_progress (без кэша)"""
+        # Используем готовый view
+        query = self.client.table("student_progress") \
+            .select("*")
+        response = await self._execute("student_progress", query)
+
+        progress_data = response.data
+
+        # Данные студентов одним запросом к зеркалу, если оно включено
+        mirror = await self._fresh_mirror()
+        mirror_students = None
+        if mirror is not None:
+            mirror_students = await asyncio.to_thread(
+                mirror.students_by_id, {row.get("studentid") for row in progress_data}
+            )
+
+        # Группируем по студентам
+        students_dict = {}
+        for row in progress_data:
+            student_id = row.get("studentid")
+            if student_id not in students_dict:
+                # Получаем доп. информацию о студенте
+                if mirror_students is not None:
+                    student_info = mirror_students.get(str(student_id), {})
+                else:
+                    student_info = await self._fetch_row(
+                        "stdlist", "fullname, tgid, isactive, createdat, \"Group\"", student_id
+                    )
 
-            # Активные студенты
-            active_students_response = self.client.table("stdlist") \
-                .select("*", count="exact") \
-                .eq("isactive", True) \
-                .execute()
+                # Парсим имя
+                fullname = student_info.get("fullname", "").strip()
+                first_name = ""
+                last_name = ""
 
-            active_students = active_students_response.count if hasattr(active_students_response, 'count') else 0
+                if fullname:
+                    parts = fullname.split()
+                    if len(parts) >= 2:
+                        first_name = parts[0]
+                        last_name = " ".join(parts[1:])
+                    else:
+                        first_name = fullname
 
-            # Количество тем
-            topics_response = self.client.table("topiclist") \
-                .select("*", count="exact") \
-                .eq("isactive", True) \
-                .execute()
+                students_dict[student_id] = {
+                    "id": student_id,
+                    "tgid": student_info.get("tgid", ""),
+                    "fullname": fullname,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "group": student_info.get("Group", ""),
+                    "is_active": bool(student_info.get("isactive", True)),
+                    "created_at": student_info.get("createdat"),
+                    "topics": [],
+                    "completed_count": 0,
+                    "practice_score_avg": 0,
+                    "test_score_avg": 0
+                }
 
-            total_topics = topics_response.count if hasattr(topics_response, 'count') else 0
+            # Добавляем тему
+            students_dict[student_id]["topics"].append({
+                "topicid": row.get("topicid"),
+                "topicname": row.get("topicname"),
+                "practice_done": row.get("practice_done", False),
+                "practice_score": row.get("practice_score"),
+                "test_done": row.get("test_done", False),
+                "test_score": row.get("test_score")
+            })
+
+        # Считаем статистику для каждого студента
+        students_progress = []
+        practice_scores = []
+        test_scores = []
+        completed_counts = []
+        active_count = 0
+
+        for student in students_dict.values():
+            topics = student["topics"]
+
+            # Считаем выполненные практики и тесты
+            practice_done = [t for t in topics if t["practice_done"]]
+            test_done = [t for t in topics if t["test_done"]]
+
+            completed_topics = len([t for t in topics if t["practice_done"] or t["test_done"]])
+            student["completed_count"] = completed_topics
+            completed_counts.append(completed_topics)
+
+            # Считаем средние баллы
+            practice_scores_student = [t["practice_score"] for t in practice_done if
+                                       t["practice_score"] is not None]
+            test_scores_student = [t["test_score"] for t in test_done if t["test_score"] is not None]
+
+            practice_avg = sum(practice_scores_student) / len(
+                practice_scores_student) if practice_scores_student else 0
+            test_avg = sum(test_scores_student) / len(test_scores_student) if test_scores_student else 0
+
+            student["practice_score_avg"] = practice_avg
+            student["test_score_avg"] = test_avg
+
+            # Общие средние
+            practice_scores.extend(practice_scores_student)
+            test_scores.extend(test_scores_student)
+
+            # Активен ли студент
+            if student["is_active"]:
+                active_count += 1
+
+            # Формируем для шаблона
+            students_progress.append({
+                "id": student["id"],
+                "tgid": student["tgid"],
+                "username": "",
+                "first_name": student["first_name"],
+                "last_name": student["last_name"],
+                "completed_topics": completed_topics,
+                "total_topics": len(topics),
+                "average_score": round((practice_avg + test_avg) / 2, 1) if practice_avg > 0 or test_avg > 0 else 0,
+                "last_activity": None,  # Нет поля последней активности
+                "is_active": student["is_active"],
+                "group": student["group"]
+            })
+
+        # Считаем общую статистику
+        avg_progress = sum(completed_counts) / (len(completed_counts) * len(
+            students_dict[list(students_dict.keys())[0]]["topics"])) * 100 if students_dict else 0
+
+        # Новые студенты (за последние 7 дней)
+        week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+        new_students = 0
+
+        for student in students_dict.values():
+            dt = parse_timestamp(student["created_at"])
+            if dt and dt > week_ago:
+                new_students += 1
+
+        return {
+            "average_progress": round(avg_progress, 1),
+            "active_students": active_count,
+            "completed_students": len([s for s in students_progress if s["completed_topics"] >= 3]),
+            # Завершили хотя бы 3 темы
+            "new_students": new_students,
+            "students": students_progress[:100],  # Ограничиваем для производительности
+            "total_students": len(students_progress)
+        }
 
-            # Активные сессии (последние 24 часа)
-            day_ago = datetime.now() - timedelta(dours=24)
-            active_sessions_response = self.client.table("sessionlist") \
-                .select("*", count="exact") \
-                .gte("created_at", day_ago.isoformat()) \
-                .execute()
-
-            active_sessions = active_sessions_response.count if hasattr(active_sessions_response, 'count') else 0
-
-            # Последние сессии (доработанные данные)
-            recent_sessions_response = self.client.table("sessionlist") \
-                .select("id, tgid, mode, topicid, current_index, total, created_at") \
-                .order("created_at", desc=True) \
-                .limit(10) \
-                .execute()
-
-            recent_sessions = []
-            for session in recent_sessions_response.data:
-                # Получаем название темы
-                topic_name = ""
-                topic_id = session.get("topicid")
-                if topic_id:
-                    try:
-                        topic_response = self.client.table("topiclist") \
-                            .select("topicname") \
-                            .eq("id", topic_id) \
-                            .single() \
-                            .execute()
-                        topic_name = topic_response.data.get("topicname", "")
-                    except:
-                        topic_name = f"Тема {topic_id}"
-
-                recent_sessions.append({
-                    "id": session.get("id"),
-                    "tgid": session.get("tgid"),
-                    "mode": session.get("mode", "learning"),
-                    "topicid": topic_id,
-                    "topic_name": topic_name,
-                    "current_index": session.get("current_index", 0),
-                    "total": session.get("total", 10),
-                    "created_at": session.get("created_at")
-                })
+    # Статистика
+    async def get_statistics(self) -> Dict[str, Any]:
+        """Получить статистику по системе"""
+        return await self._cached(
+            "statistics", "all",
+            lambda: self._fetch_statistics(),
+            fallback={
+                "total_students": 0,
+                "active_students": 0,
+                "total_topics": 0,
+                "active_sessions": 0,
+                "recent_sessions": []
+            }
+        )
 
+    async def _fetch_statistics(self) -> Dict[str, Any]:
+        """Загрузить статистику по системе из Supabase (без кэша)"""
+        mirror = await self._fresh_mirror()
+        if mirror is not None:
+            stats = await asyncio.to_thread(mirror.statistics)
+            await self.refresh_session_activity()
             return {
-                "total_students": total_students,
-                "active_students": active_students,
-                "total_topics": total_topics,
-                "active_sessions": active_sessions,
-                "recent_sessions": recent_sessions
+                "total_students": stats["total_students"],
+                "active_students": stats["active_students"],
+                "total_topics": stats["total_topics"],
+                "active_sessions": self.activity.count_last_hours(24),
+                "recent_sessions": [
+                    self._format_recent_session(row, row["topicname"]) for row in stats["recent_sessions"]
+                ]
             }
 
+        # Количество студентов
+        query = self.client.table("stdlist") \
+            .select("*", count="exact")
+        students_response = await self._execute("stdlist", query)
+
+        total_students = students_response.count if hasattr(students_response, 'count') else 0
+
+        # Активные студенты
+        query = self.client.table("stdlist") \
+            .select("*", count="exact") \
+            .eq("isactive", True)
+        active_students_response = await self._execute("stdlist", query)
+
+        active_students = active_students_response.count if hasattr(active_students_response, 'count') else 0
+
+        # Количество тем
+        query = self.client.table("topiclist") \
+            .select("*", count="exact") \
+            .eq("isactive", True)
+        topics_response = await self._execute("topiclist", query)
+
+        total_topics = topics_response.count if hasattr(topics_response, 'count') else 0
+
+        # Активные сессии (последние 24 часа) — из предрассчитанных бакетов
+        await self.refresh_session_activity()
+        active_sessions = self.activity.count_last_hours(24)
+
+        # Последние сессии (доработанные данные)
+        query = self.client.table("sessionlist") \
+            .select("id, tgid, mode, topicid, current_index, total, created_at") \
+            .order("created_at", desc=True) \
+            .limit(10)
+        recent_sessions_response = await self._execute("sessionlist", query)
+
+        recent_sessions = []
+        for session in recent_sessions_response.data:
+            # Получаем название темы
+            topic_name = ""
+            topic_id = session.get("topicid")
+            if topic_id:
+                topic = await self._fetch_row("topiclist", "topicname", topic_id)
+                topic_name = topic.get("topicname", "")
+
+            recent_sessions.append(self._format_recent_session(session, topic_name))
+
+        return {
+            "total_students": total_students,
+            "active_students": active_students,
+            "total_topics": total_topics,
+            "active_sessions": active_sessions,
+            "recent_sessions": recent_sessions
+        }
+
+    @staticmethod
+    def _format_recent_session(session: Dict[str, Any], topic_name: str) -> Dict[str, Any]:
+        """Строка sessionlist для таблицы последних сессий на главной"""
+        return {
+            "id": session.get("id"),
+            "tgid": session.get("tgid"),
+            "mode": session.get("mode", "learning"),
+            "topicid": session.get("topicid"),
+            "topic_name": topic_name,
+            "current_index": session.get("current_index", 0),
+            "total": session.get("total", 10),
+            "created_at": session.get("created_at")
+        }
+
+    # Локальное зеркало
+    async def _fresh_mirror(self) -> Optional[LocalMirror]:
+        """Зеркало, если оно включено и не старше mirror_max_staleness_seconds.
+
+        Устаревшее зеркало сначала догружается; если Supabase недоступен,
+        возвращается None и отчеты строятся через PostgREST как обычно.
+        """
+        mirror = self.mirror
+        if mirror is None:
+            return None
+
+        max_age = self.settings.mirror_max_staleness_seconds
+        if await asyncio.to_thread(mirror.age_seconds) <= max_age:
+            return mirror
+
+        try:
+            await self.sync_mirror()
         except Exception as e:
-            print(f"Error in get_statistics: {e}")
+            print(f"Error in sync_mirror: {e}")
+
+        if await asyncio.to_thread(mirror.age_seconds) <= max_age:
+            return mirror
+        return None
+
+    async def sync_mirror(self, full: bool = False) -> Dict[str, int]:
+        """Догрузить новые строки всех таблиц зеркала по водяным знакам.
+
+        Небольшие справочники (full) перечитываются целиком при каждой
+        синхронизации, чтобы правки и удаления попадали в границу
+        mirror_max_staleness_seconds. У таблиц с tail (sessionlist) заодно
+        перечитываются строки за последние mirror_session_tail_hours: они
+        меняются после вставки. Полная
+        пересинхронизация (изменения и удаления старых строк) раз в
+        mirror_full_resync_seconds идет в фоне, а не в запросе пользователя;
+        синхронно таблица читается целиком только при первой загрузке или full=True.
+        """
+        mirror = self.mirror
+        if mirror is None:
+            return {}
+
+        if self._mirror_lock is None:
+            self._mirror_lock = asyncio.Lock()
+
+        synced = {}
+        resync_due = False
+        async with self._mirror_lock:
+            for table, spec in MIRROR_TABLES.items():
+                state = await asyncio.to_thread(mirror.state, table)
+                if time.time() - state["synced_at"] < 1:
+                    # Таблицу только что синхронизировал другой запрос
+                    continue
+
+                full_table = full or state["watermark"] is None or spec.get("full", False)
+                if time.time() - state["full_synced_at"] > self.settings.mirror_full_resync_seconds:
+                    resync_due = resync_due or not full_table
+
+                since = None if full_table else self._mirror_since(spec, state["watermark"])
+                rows = await self._fetch_mirror_rows(table, spec, since)
+                await asyncio.to_thread(mirror.upsert, table, rows, full_table)
+                watermark = rows[-1].get(spec["watermark"]) if rows else None
+                await asyncio.to_thread(mirror.mark_synced, table, watermark, full_table)
+                synced[table] = len(rows)
+
+        if resync_due and (self._mirror_resync is None or self._mirror_resync.done()):
+            self._mirror_resync = asyncio.create_task(self._resync_mirror())
+        return synced
+
+    def _mirror_since(self, spec: Dict[str, Any], watermark: str) -> str:
+        """Нижняя граница инкрементальной загрузки: водяной знак или начало окна tail"""
+        if not spec.get("tail"):
+            return watermark
+        tail_start = datetime.now(timezone.utc) - timedelta(hours=self.settings.mirror_session_tail_hours)
+        watermark_dt = parse_timestamp(watermark)
+        if watermark_dt is None or tail_start < watermark_dt:
+            return tail_start.isoformat()
+        return watermark
+
+    async def _fetch_mirror_rows(
+            self,
+            table: str,
+            spec: Dict[str, Any],
+            since: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """Прочитать строки таблицы начиная с since (None — всю таблицу)"""
+        column = spec["watermark"]
+        batch_size = self.settings.mirror_batch_size
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            # id добавлен в сортировку, чтобы страницы OFFSET не теряли строки с равным водяным знаком
+            query = self.client.table(table) \
+                .select(spec.get("select", "*")) \
+                .order(column if column == "id" else f"{column},id") \
+                .range(offset, offset + batch_size - 1)
+            if since is not None:
+                query = query.gte(column, since)
+            response = await self._execute(table, query)
+
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < batch_size:
+                return rows
+            offset += batch_size
+
+    async def _resync_mirror(self) -> None:
+        """Фоновая полная пересинхронизация; блокировка зеркала берется только на запись"""
+        mirror = self.mirror
+        try:
+            for table, spec in MIRROR_TABLES.items():
+                state = await asyncio.to_thread(mirror.state, table)
+                if time.time() - state["full_synced_at"] <= self.settings.mirror_full_resync_seconds:
+                    continue
+                rows = await self._fetch_mirror_rows(table, spec, None)
+                async with self._mirror_lock:
+                    await asyncio.to_thread(mirror.upsert, table, rows, True)
+                    # Водяной знак снимка может быть старше текущего: следующая
+                    # инкрементальная загрузка дочитает строки, вставленные за время чтения
+                    watermark = rows[-1].get(spec["watermark"]) if rows else None
+                    await asyncio.to_thread(mirror.mark_synced, table, watermark, True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in _resync_mirror: {e}")
+
+    # Аналитика активности
+    async def refresh_session_activity(self, force: bool = False) -> int:
+        """Догрузить новые сессии (после водяного знака created_at) в бакеты активности.
+
+        Обновления выполняются по одному: параллельные вызовы ждут текущий
+        и не перечитывают те же строки.
+        """
+        if self._activity_lock is None:
+            self._activity_lock = asyncio.Lock()
+
+        seen_refresh = self.activity.last_refresh
+        async with self._activity_lock:
+            last_refresh = self.activity.last_refresh
+            if last_refresh != seen_refresh:
+                # Пока ждали блокировку, обновление выполнил другой запрос
+                return 0
+            if not force and last_refresh and \
+                    datetime.now(timezone.utc) - last_refresh < timedelta(seconds=self.settings.activity_refresh_seconds):
+                return 0
+            return await self._load_session_activity()
+
+    async def _load_session_activity(self) -> int:
+        """Прочитать сессии начиная с водяного знака (вызывается под _activity_lock)"""
+        watermark = self.activity.watermark
+        if watermark is None:
+            # Первая загрузка: только период хранения суточных бакетов
+            since = datetime.now(timezone.utc) - timedelta(days=self.activity.daily_retention_days)
+            watermark = since.isoformat()
+
+        added = 0
+        offset = 0
+        batch_size = self.settings.activity_batch_size
+        while True:
+            query = self.client.table("sessionlist") \
+                .select("id, mode, topicid, created_at") \
+                .gte("created_at", watermark) \
+                .order("created_at,id") \
+                .range(offset, offset + batch_size - 1)
+            response = await self._execute("sessionlist", query)
+
+            rows = response.data or []
+            added += self.activity.add_sessions(rows)
+            if len(rows) < batch_size:
+                break
+            offset += batch_size
+
+        self.activity.last_refresh = datetime.now(timezone.utc)
+        return added
+
+    async def get_session_activity(
+            self,
+            granularity: str = "day",
+            periods: int = 90,
+            mode: Optional[str] = None,
+            topic_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Получить ряд активности сессий по часам или дням"""
+        async def load() -> Dict[str, Any]:
+            stale = False
+            try:
+                await self.refresh_session_activity()
+            except Exception as e:
+                print(f"Error in get_session_activity: {e}")
+                stale = True
+
             return {
-                "total_students": 0,
-                "active_students": 0,
-                "total_topics": 0,
-                "active_sessions": 0,
-                "recent_sessions": []
+                "granularity": granularity,
+                "series": self.activity.series(granularity, periods, mode=mode, topic_id=topic_id),
+                "breakdown": self.activity.breakdown(granularity, periods),
+                "watermark": self.activity.watermark,
+                "stale": stale
             }
 
+        # Ряды общие для всех воркеров: пересчитывает только один из них раз в refresh-интервал
+        return await self._get_or_load(
+            "activity", f"{granularity}:{periods}:{mode}:{topic_id}",
+            load,
+            self.settings.activity_refresh_seconds
+        )
+
+
+    # Аналитика вопросов
+    async def _stream_sessions(self, **filters: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Читать sessionlist чанками по возрастанию created_at (фильтры: gte/lt)"""
+        chunk_size = self.settings.question_analytics_chunk_size
+        offset = 0
+        while True:
+            query = self.client.table("sessionlist") \
+                .select("id, topicid, mode, created_at, current_index, total, questions, answers") \
+                .order("created_at,id") \
+                .range(offset, offset + chunk_size - 1)
+            for operator, value in filters.items():
+                if value is not None:
+                    query = getattr(query, operator)("created_at", value)
+            response = await self._execute("sessionlist", query)
+
+            rows = response.data or []
+            yield rows
+            if len(rows) < chunk_size:
+                break
+            offset += chunk_size
+
+    async def refresh_question_analytics(self, force: bool = False) -> None:
+        """Догрузить устоявшиеся сессии после водяного знака и перечитать свежие.
+
+        Обновление одно на процесс: запросы разных тем ждут текущее, а не
+        запускают параллельное чтение той же истории.
+        """
+        if self._questions_lock is None:
+            self._questions_lock = asyncio.Lock()
+
+        questions = self.questions
+        seen_refresh = questions.last_refresh
+        async with self._questions_lock:
+            if questions.last_refresh != seen_refresh:
+                # Пока ждали блокировку, обновление выполнил другой запрос
+                return
+            now = datetime.now(timezone.utc)
+            refresh_interval = timedelta(seconds=self.settings.question_analytics_refresh_seconds)
+            if not force and questions.last_refresh and now - questions.last_refresh < refresh_interval:
+                return
+            await self._load_question_analytics(now)
+
+    async def _load_question_analytics(self, now: datetime) -> None:
+        """Прочитать сессии для аналитики вопросов (вызывается под _questions_lock)"""
+        questions = self.questions
+        settle_cutoff = (now - timedelta(hours=questions.settle_hours)).isoformat()
+
+        # Историю, уже прочитанную другим воркером, берем из общего кэша
+        shared = self.cache.shared
+        if shared:
+            try:
+                snapshot = await self.cache.get("question_snapshot", "frozen")
+                if snapshot is not None:
+                    questions.restore(snapshot)
+            except Exception as e:
+                print(f"Error in _load_question_analytics (snapshot): {e}")
+
+        added = 0
+        async for rows in self._stream_sessions(gte=questions.watermark, lt=settle_cutoff):
+            added += questions.add_frozen(rows)
+
+        if shared and added:
+            try:
+                await self.cache.set(
+                    "question_snapshot", "frozen", questions.snapshot(),
+                    self.settings.question_analytics_snapshot_ttl_seconds
+                )
+            except Exception as e:
+                print(f"Error in _load_question_analytics (snapshot): {e}")
+
+        tail = []
+        async for rows in self._stream_sessions(gte=settle_cutoff):
+            tail.extend(rows)
+        questions.replace_tail(tail)
+
+        questions.last_refresh = now
+
+    async def get_topic_question_stats(self, topic_id: int) -> Dict[str, Any]:
+        """Статистика вопросов темы: сложность, доля ответов и точки выхода"""
+        async def load() -> Dict[str, Any]:
+            await self.refresh_question_analytics()
+            stats = self.questions.topic_stats(topic_id)
+            topic = await self._fetch_row("topiclist", "topicname", topic_id)
+            return {**stats, "topic_name": topic.get("topicname", "")}
+
+        return await self._cached(
+            "question_stats", str(topic_id),
+            load,
+            fallback={
+                "topic_id": topic_id,
+                "topic_name": "",
+                "sessions": 0,
+                "completed_sessions": 0,
+                "completion_rate": 0,
+                "avg_answered_share": 0,
+                "positions": [],
+                "questions": []
+            },
+            ttl=self.settings.question_analytics_refresh_seconds
+        )
+
+
+    # Аналитика по группам
+    async def _fetch_all(self, table: str, columns: str, order: Tuple[str, ...]) -> List[Dict[str, Any]]:
+        """Прочитать таблицу целиком постранично (PostgREST ограничивает размер ответа).
+
+        order должен быть уникальным ключом: при сортировке с повторами Postgres
+        не сохраняет порядок равных строк между страницами OFFSET.
+        """
+        batch_size = self.settings.cohort_batch_size
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            # Один параметр order=a,b: PostgREST сортирует по всем колонкам по возрастанию
+            query = self.client.table(table) \
+                .select(columns) \
+                .order(",".join(order)) \
+                .range(offset, offset + batch_size - 1)
+            response = await self._execute(table, query)
+
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < batch_size:
+                return rows
+            offset += batch_size
+
+    async def get_cohort_analytics(self) -> Dict[str, Any]:
+        """Статистика прогресса по группам (колонка Group в stdlist)"""
+        async def load() -> Dict[str, Any]:
+            # Импорт NumPy откладывается до первого построения отчета
+            from analytics.cohorts import build_cohorts
+
+            progress_rows, students = await asyncio.gather(
+                self._fetch_all(
+                    "student_progress",
+                    "studentid, topicid, topicname, practice_done, practice_score, test_done, test_score",
+                    ("studentid", "topicid")
+                ),
+                self._fetch_all("stdlist", "id, \"Group\"", ("id",))
+            )
+            return await asyncio.to_thread(build_cohorts, progress_rows, students)
+
+        return await self._cached(
+            "cohorts", "all",
+            load,
+            fallback={"groups": [], "topics": [], "histogram_edges": [], "rows": 0}
+        )
+
+
+def encode_timeline_cursor(event: Dict[str, Any]) -> str:
+    """Курсор ленты: время и ключ последнего события страницы"""
+    raw = json.dumps([event["ts"], event["key"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_timeline_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Разобрать курсор ленты; ValueError, если он поврежден"""
+    if not cursor:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, key = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор: {e}")
+    if not isinstance(ts, str) or not isinstance(key, str):
+        raise ValueError("Некорректный курсор")
+    return ts, key
+
+
+def create_data_client() -> SupabaseClient:
+    """Клиент данных по settings.database_backend: supabase (PostgREST) или postgres (пул asyncpg)"""
+    if get_settings().database_backend == "postgres":
+        from database.postgres_client import PostgresClient
+
+        return PostgresClient()
+    return SupabaseClient()
+
+
+_data_client: Optional[SupabaseClient] = None
+
+
+def get_data_client() -> SupabaseClient:
+    """Глобальный клиент данных; бэкенд выбирается при первом обращении, а не при импорте"""
+    global _data_client
+    if _data_client is None:
+        _data_client = create_data_client()
+    return _data_client
+
+
+class _DataClientProxy:
+    """Глобальное имя supabase_client: атрибуты берутся у get_data_client()"""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_data_client(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(get_data_client(), name, value)
+
 
-# Создаем глобальный экземпляр клиента
-supabase_client = SupabaseClient()
\ No newline at end of file
+# Создаем глобальный экземпляр клиента (настройки читаются при первом обращении, в lifespan)
+supabase_client = _DataClientProxy()
@@ -1,32 +1,222 @@
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import secrets
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from config import settings
-from database.supabase_client import supabase_client
+from assets import AssetManifest, PrecompressedStaticFiles, build_assets
+from config import get_settings
+from database.supabase_client import get_data_client, supabase_client
+from database.resilience import AdmissionController, BackendUnavailable
+from profiler import RequestProfile, StackSampler, ProfileStore, current_profile, profile_phase, profiled
 from datetime import datetime
 
+settings = get_settings()
+
+admission = AdmissionController(
+    max_in_flight=settings.max_in_flight_requests,
+    max_loop_lag=settings.max_event_loop_lag_seconds
+)
+
+sampler = StackSampler(interval=settings.profiling_interval_ms / 1000)
+profile_store = ProfileStore(settings.profiling_dir, keep=settings.profiling_keep)
+PROFILE_MODES = ("1", "store", "folded", "json")
+asset_manifest = AssetManifest("static")
+
+
+async def warm_up(app: FastAPI) -> None:
+    """Прогрев: создать клиент, открыть соединения и заполнить кэши.
+
+    Повторяется с нарастающей паузой, пока Supabase не ответит;
+    до этого /readyz возвращает 503 и балансировщик не шлет трафик.
+    """
+    delay = 1.0
+    while True:
+        started = time.perf_counter()
+        try:
+            await supabase_client.connect()
+            await supabase_client.refresh_session_activity(force=True)
+            await supabase_client.sync_mirror()
+            await supabase_client.get_statistics()
+            await asyncio.gather(
+                supabase_client.get_students(page=1, page_size=settings.page_size),
+                supabase_client.get_topics(page=1, page_size=settings.page_size),
+                supabase_client.get_sessions(page=1, page_size=settings.page_size),
+                supabase_client.get_student_progress()
+            )
+            app.state.warmup_seconds = round(time.perf_counter() - started, 3)
+            app.state.ready = True
+            print(f"Warm-up finished in {app.state.warmup_seconds}s")
+            return
+        except Exception as e:
+            print(f"Error in warm_up: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+async def build_static() -> None:
+    """Собрать статику (имена с хешем, .gz/.br) и перечитать манифест.
+
+    Повторная сборка без изменений занимает миллисекунды; до ее окончания
+    шаблоны ссылаются на исходные файлы /static/...
+    """
+    try:
+        await asyncio.to_thread(build_assets, "static")
+        asset_manifest.load()
+    except Exception as e:
+        print(f"Error in build_static: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.warmup_seconds = None
+    app.state.started_at = time.time()
+    # Бэкенд данных (supabase/postgres) выбирается здесь, а не при импорте модуля
+    get_data_client()
+    warmup_task = asyncio.create_task(warm_up(app))
+    lag_task = asyncio.create_task(admission.monitor_loop_lag())
+    assets_task = asyncio.create_task(build_static()) if settings.assets_build_on_startup else None
+    yield
+    warmup_task.cancel()
+    lag_task.cancel()
+    if assets_task is not None:
+        assets_task.cancel()
+    await supabase_client.close()
+
+
 # Создаем приложение
 app = FastAPI(
     title=settings.app_title,
     description=settings.app_description,
-    version=settings.app_version
+    version=settings.app_version,
+    lifespan=lifespan
 )
 
-# Подключаем статические файлы
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Сброс нагрузки: пробы и статика не ограничиваются
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    path = request.url.path
+    if path in ("/healthz", "/readyz") or path.startswith("/static"):
+        return await call_next(request)
+
+    if not admission.try_acquire():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"success": False, "detail": "Сервер перегружен, повторите позже"},
+            headers={"Retry-After": "2"}
+        )
+    try:
+        return await call_next(request)
+    finally:
+        admission.release()
+
+
+class RequestProfilerMiddleware:
+    """Профилирование запроса по заголовку X-Profile или параметру ?profile= (только администратор).
+
+    1/store — обычный ответ, профиль сохраняется, id и разбивка времени в
+    заголовках X-Profile-Id и Server-Timing; folded — вместо ответа стеки
+    в folded-формате для flame graph; json — вместо ответа сводка по фазам.
+    Чистый ASGI: без профилирования запрос передается дальше как есть.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.profiling_enabled:
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        mode = request.headers.get("x-profile") or request.query_params.get("profile")
+        if mode not in PROFILE_MODES:
+            return await self.app(scope, receive, send)
+        try:
+            credentials = await optional_security(request)
+        except HTTPException:
+            credentials = None
+        if not is_admin(credentials):
+            return await self.app(scope, receive, send)
+
+        start: Dict[str, Any] = {}
+        body = []
+
+        # Ответ придерживается до конца запроса: заголовки с разбивкой известны только тогда
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+
+        profile = RequestProfile(request.method, request.url.path, threading.get_ident())
+        token = current_profile.set(profile)
+        sampler.add(profile)
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            sampler.remove(profile)
+            profile.finish()
+            current_profile.reset(token)
+
+        timing = {"Server-Timing": profile.server_timing(), "X-Profile-Id": profile.id}
+        if mode == "folded":
+            return await PlainTextResponse(profile.folded(), headers=timing)(scope, receive, send)
+        if mode == "json":
+            return await JSONResponse({"success": True, "data": profile.summary()}, headers=timing)(scope, receive, send)
+
+        try:
+            await asyncio.to_thread(profile_store.save, profile)
+        except Exception as e:
+            print(f"Error in request_profiler: {e}")
+        headers = MutableHeaders(scope=start)
+        headers.update(timing)
+        await send(start)
+        await send({"type": "http.response.body", "body": b"".join(body), "more_body": False})
+
+
+app.add_middleware(RequestProfilerMiddleware)
+
+@app.exception_handler(BackendUnavailable)
+async def backend_unavailable_handler(request: Request, exc: BackendUnavailable):
+    """Бэкенд недоступен: 503 вместо ложного 404 или пустых данных"""
+    print(f"Error in {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"success": False, "detail": "База данных временно недоступна, повторите позже"},
+        headers={"Retry-After": "5"}
+    )
+
+
+# Подключаем статические файлы (собранные отдаются сжатыми и кэшируются навсегда)
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 # Настраиваем шаблоны
-templates = Jinja2Templates(directory="templates")
+class ProfiledTemplates(Jinja2Templates):
+    """Шаблоны, время рендеринга которых попадает в профиль запроса"""
+
+    def TemplateResponse(self, *args: Any, **kwargs: Any):
+        with profile_phase("template"):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+templates = ProfiledTemplates(directory="templates")
 
 # Базовая аутентификация
 security = HTTPBasic()
+optional_security = HTTPBasic(auto_error=False)
 
 
+@profiled("format_datetime")
 def format_datetime(value: Any, format: str = "%Y-%m-%d %H:%M") -> str:
     """Форматирует дату из строки или объекта datetime"""
     if not value:
@@ -65,12 +255,24 @@ def format_datetime(value: Any, format: str = "%Y-%m-%d %H:%M") -> str:
         return str(value)
 
 templates.env.filters["format_datetime"] = format_datetime
+templates.env.globals["asset"] = asset_manifest.url
 
-def verify_admin(credentials: HTTPBasicCredentials = Depends(security)):
+
+def freshness(data: Dict[str, Any]) -> Dict[str, bool]:
+    """Признаки устаревших или недоступных данных для баннера в шаблоне"""
+    return {"stale": bool(data.get("stale")), "unavailable": bool(data.get("unavailable"))}
+
+
+def is_admin(credentials: Optional[HTTPBasicCredentials]) -> bool:
+    if credentials is None:
+        return False
     correct_username = secrets.compare_digest(credentials.username, settings.admin_username)
     correct_password = secrets.compare_digest(credentials.password, settings.admin_password)
+    return correct_username and correct_password
+
 
-    if not (correct_username and correct_password):
+def verify_admin(credentials: HTTPBasicCredentials = Depends(security)):
+    if not is_admin(credentials):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверные учетные данные",
@@ -88,6 +290,7 @@ async def dashboard(request: Request, username: str = Depends(verify_admin)):
         "dashboard.html",
         {
             "request": request,
+            "freshness": freshness(stats),
             "username": username,
             "stats": stats,
             "title": "Панель управления"
@@ -108,6 +311,7 @@ async def students_view(
         "tables/students.html",
         {
             "request": request,
+            "freshness": freshness(students_data),
             "students": students_data["data"],
             "pagination": {
                 "page": students_data["page"],
@@ -133,6 +337,7 @@ async def topics_view(
         "tables/topics.html",
         {
             "request": request,
+            "freshness": freshness(topics_data),
             "topics": topics_data["data"],
             "pagination": {
                 "page": topics_data["page"],
@@ -158,6 +363,7 @@ async def sessions_view(
         "tables/sessions.html",
         {
             "request": request,
+            "freshness": freshness(sessions_data),
             "sessions": sessions_data["data"],
             "pagination": {
                 "page": sessions_data["page"],
@@ -182,12 +388,80 @@ async def progress_view(
         "tables/progress.html",
         {
             "request": request,
+            "freshness": freshness(progress_data),
             "progress": progress_data,
             "title": "Прогресс студентов"
         }
     )
 
 
+@app.get("/cohorts", response_class=HTMLResponse)
+async def cohorts_view(
+        request: Request,
+        username: str = Depends(verify_admin)
+):
+    """Страница аналитики по группам"""
+    cohorts = await supabase_client.get_cohort_analytics()
+
+    return templates.TemplateResponse(
+        "tables/cohorts.html",
+        {
+            "request": request,
+            "freshness": freshness(cohorts),
+            "cohorts": cohorts,
+            "title": "Группы"
+        }
+    )
+
+
+@app.get("/analytics/topics/{topic_id}", response_class=HTMLResponse)
+async def topic_analytics_view(
+        request: Request,
+        topic_id: int,
+        username: str = Depends(verify_admin)
+):
+    """Страница аналитики вопросов темы"""
+    stats = await supabase_client.get_topic_question_stats(topic_id)
+
+    return templates.TemplateResponse(
+        "analytics/topic.html",
+        {
+            "request": request,
+            "freshness": freshness(stats),
+            "stats": stats,
+            "title": "Аналитика темы"
+        }
+    )
+
+
+# Пробы для оркестратора
+@app.get("/healthz")
+async def healthz():
+    """Процесс жив"""
+    return {
+        "status": "ok",
+        "import_seconds": IMPORT_SECONDS,
+        "uptime_seconds": round(time.time() - app.state.started_at, 1)
+    }
+
+
+@app.get("/readyz")
+async def readyz():
+    """Готов принимать трафик: клиент создан и кэши прогреты"""
+    body = {
+        "ready": app.state.ready,
+        "client_initialized": supabase_client.is_initialized,
+        "warmup_seconds": app.state.warmup_seconds,
+        "breakers": supabase_client.guard.status(),
+        "in_flight": admission.in_flight,
+        "loop_lag_seconds": round(admission.loop_lag, 3),
+        "shed_count": admission.shed_count
+    }
+    if not app.state.ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+
+
 # API endpoints для AJAX запросов
 @app.get("/api/students/{student_id}")
 async def get_student_api(student_id: int, username: str = Depends(verify_admin)):
@@ -198,6 +472,21 @@ async def get_student_api(student_id: int, username: str = Depends(verify_admin)
     return {"success": True, "data": student}
 
 
+@app.get("/api/students/{student_id}/timeline")
+async def get_student_timeline_api(
+        student_id: int,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        username: str = Depends(verify_admin)
+):
+    """API: Лента активности студента с пагинацией по курсору"""
+    try:
+        timeline = await supabase_client.get_student_timeline(student_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "data": timeline}
+
+
 @app.put("/api/students/{student_id}")
 async def update_student_api(
         student_id: int,
@@ -216,6 +505,59 @@ async def get_statistics_api(username: str = Depends(verify_admin)):
     return {"success": True, "data": stats}
 
 
+@app.get("/api/cohorts")
+async def get_cohorts_api(username: str = Depends(verify_admin)):
+    """API: Статистика прогресса по группам"""
+    cohorts = await supabase_client.get_cohort_analytics()
+    return {"success": True, "data": cohorts}
+
+
+@app.get("/api/analytics/topics/{topic_id}")
+async def get_topic_analytics_api(topic_id: int, username: str = Depends(verify_admin)):
+    """API: Статистика вопросов темы"""
+    stats = await supabase_client.get_topic_question_stats(topic_id)
+    return {"success": True, "data": stats}
+
+
+@app.get("/api/analytics/activity")
+async def get_activity_api(
+        granularity: str = "day",
+        periods: int = 90,
+        mode: Optional[str] = None,
+        topic_id: Optional[int] = None,
+        username: str = Depends(verify_admin)
+):
+    """API: Активность сессий по часам/дням"""
+    if granularity not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="granularity должен быть hour или day")
+    activity = await supabase_client.get_session_activity(
+        granularity=granularity,
+        periods=max(1, periods),
+        mode=mode,
+        topic_id=topic_id
+    )
+    return {"success": True, "data": activity}
+
+
+@app.get("/api/profiles")
+async def list_profiles_api(username: str = Depends(verify_admin)):
+    """API: Сохраненные профили запросов (новые сверху)"""
+    profiles = await asyncio.to_thread(profile_store.list)
+    return {"success": True, "data": profiles}
+
+
+@app.get("/api/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_api(profile_id: str, username: str = Depends(verify_admin)):
+    """API: Профиль в folded-формате (flamegraph.pl, speedscope)"""
+    folded = await asyncio.to_thread(profile_store.folded, profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return PlainTextResponse(folded)
+
+
+IMPORT_SECONDS = round(time.perf_counter() - _import_started, 4)
+
+
 if __name__ == "__main__":
     import uvicorn
 
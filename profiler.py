@@ -0,0 +1,289 @@
+import contextvars
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Профиль текущего запроса; None — профилирование выключено (обычный случай)
+current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{16}$")
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _frame_label(code: Any) -> str:
+    """Имя кадра для folded-формата: функция и файл относительно проекта"""
+    filename = code.co_filename
+    if filename.startswith(ROOT_DIR):
+        filename = os.path.relpath(filename, ROOT_DIR)
+    else:
+        filename = "/".join(filename.replace("\\", "/").split("/")[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+class RequestProfile:
+    """Профиль одного запроса: сэмплы стеков и время по фазам.
+
+    Фазы (backend, template, format_datetime) считаются как объединение
+    интервалов: параллельные вызовы бэкенда из asyncio.gather не
+    суммируются. Время Python — остаток от общего времени запроса.
+    """
+
+    def __init__(self, method: str, path: str, loop_thread: int):
+        self.id = secrets.token_hex(8)
+        self.method = method
+        self.path = path
+        self.loop_thread = loop_thread
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.threads: Dict[int, int] = {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.phase_seconds: Dict[str, float] = {}
+        self.phase_calls: Counter = Counter()
+        self._depth: Counter = Counter()
+        self._entered: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    # Фазы
+    def enter(self, phase: str) -> None:
+        with self._lock:
+            self.phase_calls[phase] += 1
+            if self._depth[phase] == 0:
+                self._entered[phase] = time.perf_counter()
+            self._depth[phase] += 1
+
+    def exit(self, phase: str) -> None:
+        with self._lock:
+            self._depth[phase] -= 1
+            if self._depth[phase] == 0:
+                elapsed = time.perf_counter() - self._entered.pop(phase)
+                self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + elapsed
+
+    # Потоки, выполняющие вызовы бэкенда для этого запроса
+    def attach_thread(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+
+    def detach_thread(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            self.threads[ident] -= 1
+            if not self.threads[ident]:
+                del self.threads[ident]
+
+    def sample(self, frames: Dict[int, Any]) -> None:
+        """Снять стеки потока цикла событий и рабочих потоков запроса"""
+        with self._lock:
+            targets = [("event_loop", self.loop_thread)] + [("backend_thread", t) for t in self.threads]
+        stacks = []
+        for root, ident in targets:
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(root)
+            stacks.append(";".join(reversed(stack)))
+        # Сэмплер может дописывать уже снятый с учета профиль, пока его читает folded()
+        with self._lock:
+            self.stacks.update(stacks)
+            self.samples += 1
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    # Отчет
+    @property
+    def total_seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def breakdown(self) -> Dict[str, float]:
+        """Время запроса в миллисекундах: бэкенд, шаблоны (в т.ч. format_datetime) и Python"""
+        total = self.total_seconds
+        backend = self.phase_seconds.get("backend", 0.0)
+        template = self.phase_seconds.get("template", 0.0)
+        return {
+            "total": round(total * 1000, 2),
+            "backend": round(backend * 1000, 2),
+            "template": round(template * 1000, 2),
+            "format_datetime": round(self.phase_seconds.get("format_datetime", 0.0) * 1000, 2),
+            "python": round(max(total - backend - template, 0.0) * 1000, 2)
+        }
+
+    def server_timing(self) -> str:
+        """Заголовок Server-Timing: разбивка видна во вкладке Network браузера"""
+        return ", ".join(f"{name};dur={value}" for name, value in self.breakdown().items())
+
+    def folded(self) -> str:
+        """Стеки в folded-формате (flamegraph.pl, speedscope, inferno)"""
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "samples": self.samples,
+            "breakdown_ms": self.breakdown(),
+            "calls": dict(self.phase_calls)
+        }
+
+
+class StackSampler:
+    """Фоновый поток, который сэмплирует стеки активных профилей.
+
+    Поток запускается только пока есть хотя бы один профилируемый запрос,
+    поэтому без профилирования накладных расходов нет. Поток цикла событий
+    общий для всех запросов воркера: конкурентные запросы тоже попадут в
+    сэмплы ветки event_loop.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._profiles: List[RequestProfile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            if profile in self._profiles:
+                self._profiles.remove(profile)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                profiles = list(self._profiles)
+                if not profiles:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Сохраненные профили: <id>.folded и <id>.json в каталоге (общем для воркеров)"""
+
+    def __init__(self, directory: str, keep: int = 50):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, profile: RequestProfile) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile.id)
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            f.write(profile.folded())
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(profile.summary(), f, ensure_ascii=False)
+        self._prune()
+
+    def _prune(self) -> None:
+        summaries = sorted(
+            (name for name in os.listdir(self.directory) if name.endswith(".json")),
+            key=lambda name: os.path.getmtime(os.path.join(self.directory, name)),
+            reverse=True
+        )
+        for name in summaries[self.keep:]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, name[:-len(".json")] + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                        result.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(result, key=lambda summary: summary["started_at"], reverse=True)
+
+    def folded(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + ".folded"), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+@contextmanager
+def profile_phase(phase: str) -> Iterator[None]:
+    """Учесть время блока в фазе профиля текущего запроса (если он профилируется)"""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.enter(phase)
+    try:
+        yield
+    finally:
+        profile.exit(phase)
+
+
+def profiled(phase: str) -> Callable:
+    """Декоратор для синхронных функций: время вызовов попадает в фазу phase"""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            profile = current_profile.get()
+            if profile is None:
+                return fn(*args, **kwargs)
+            profile.enter(phase)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.exit(phase)
+        return wrapper
+    return decorator
+
+
+def in_profiled_thread(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """Обернуть функцию для asyncio.to_thread, чтобы сэмплер видел рабочий поток.
+
+    to_thread копирует контекст, поэтому профиль доступен и внутри потока.
+    Без профилирования функция возвращается как есть.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        return fn
+
+    def run() -> Any:
+        profile.attach_thread()
+        try:
+            return fn()
+        finally:
+            profile.detach_thread()
+    return run
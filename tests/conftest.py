@@ -0,0 +1,16 @@
+import pytest
+
+from config import get_settings
+from database.supabase_client import SupabaseClient
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """SupabaseClient с минимальными настройками из окружения"""
+    monkeypatch.setenv("SUPABASE_URL", "http://localhost")
+    monkeypatch.setenv("SUPABASE_KEY", "key")
+    monkeypatch.setenv("ADMIN_USERNAME", "admin")
+    monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    get_settings.cache_clear()
+    yield SupabaseClient()
+    get_settings.cache_clear()
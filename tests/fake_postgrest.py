@@ -0,0 +1,65 @@
+import types
+from typing import Any, Dict, List
+
+
+class FakeQuery:
+    """Подмножество построителя запросов postgrest-py поверх списка строк"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.columns = None
+        self.count = None
+        self.filters = []
+        self.ordering = []
+        self.bounds = None
+
+    def select(self, columns: str, count: str = None) -> "FakeQuery":
+        if columns.strip() != "*":
+            self.columns = [c.strip().strip('"') for c in columns.split(",")]
+        self.count = count
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) >= value)
+        return self
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) < value)
+        return self
+
+    def order(self, columns: str, desc: bool = False) -> "FakeQuery":
+        self.ordering.append(([c.strip() for c in columns.split(",")], desc))
+        return self
+
+    def range(self, start: int, end: int) -> "FakeQuery":
+        self.bounds = (start, end)
+        return self
+
+    def limit(self, size: int) -> "FakeQuery":
+        self.bounds = (0, size - 1)
+        return self
+
+    def execute(self) -> types.SimpleNamespace:
+        rows = [row for row in self.rows if all(f(row) for f in self.filters)]
+        for columns, desc in reversed(self.ordering):
+            rows = sorted(rows, key=lambda row: tuple(row[c] for c in columns), reverse=desc)
+        count = len(rows) if self.count else None
+        if self.bounds:
+            rows = rows[self.bounds[0]:self.bounds[1] + 1]
+        if self.columns:
+            rows = [{c: row.get(c) for c in self.columns} for row in rows]
+        return types.SimpleNamespace(data=[dict(row) for row in rows], count=count)
+
+
+class FakePostgrest:
+    """Клиент Supabase, у которого есть только table()"""
+
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]]):
+        self.tables = tables
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self.tables.setdefault(name, []))
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+
+from analytics.activity import SessionActivity
+
+
+def _at(dt):
+    return dt.isoformat()
+
+
+def test_count_last_hours_covers_rolling_window():
+    now = datetime.now(timezone.utc).replace(minute=30, second=0, microsecond=0)
+    activity = SessionActivity()
+    activity.add_sessions([
+        {"id": 1, "created_at": _at(now - timedelta(hours=25))},  # бакетом раньше окна
+        {"id": 2, "created_at": _at(now - timedelta(hours=24, minutes=10))},  # вне окна
+        {"id": 3, "created_at": _at(now - timedelta(hours=23, minutes=45))},  # тот же бакет, в окне
+        {"id": 4, "created_at": _at(now - timedelta(hours=12))},
+        {"id": 5, "created_at": _at(now - timedelta(minutes=5))}
+    ])
+
+    # Самый старый бакет (сессии 2 и 3) попадает в окно наполовину
+    assert activity.count_last_hours(24, now=now) == 3
+
+
+def test_add_sessions_skips_rows_already_counted():
+    now = datetime.now(timezone.utc)
+    activity = SessionActivity()
+    rows = [
+        {"id": 1, "created_at": _at(now - timedelta(hours=2))},
+        {"id": 2, "created_at": _at(now - timedelta(hours=1))},
+        {"id": 3, "created_at": _at(now - timedelta(hours=1))}
+    ]
+    assert activity.add_sessions(rows) == 3
+    # Повторная страница с тем же водяным знаком ничего не добавляет
+    assert activity.add_sessions(rows[1:]) == 0
+    assert activity.count_last_hours(24, now=now) == 3
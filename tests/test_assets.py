@@ -0,0 +1,52 @@
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from assets import DIST_DIR, IMMUTABLE, PrecompressedStaticFiles, build_assets
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _dist_files(static_dir):
+    dist = os.path.join(static_dir, DIST_DIR)
+    return {
+        os.path.relpath(os.path.join(root, name), dist).replace(os.sep, "/")
+        for root, _, files in os.walk(dist) for name in files
+    }
+
+
+def test_build_keeps_previous_build_and_prunes_older(tmp_path):
+    static_dir = str(tmp_path)
+    css = os.path.join(static_dir, "css", "style.css")
+
+    _write(css, "body { color: red; }" * 20)
+    first = build_assets(static_dir)["css/style.css"]
+    _write(css, "body { color: green; }" * 20)
+    second = build_assets(static_dir)["css/style.css"]
+    # Повторная сборка без изменений не трогает предыдущую
+    build_assets(static_dir)
+    assert {first, second, first + ".gz", second + ".gz"} <= _dist_files(static_dir)
+
+    _write(css, "body { color: blue; }" * 20)
+    third = build_assets(static_dir)["css/style.css"]
+    files = _dist_files(static_dir)
+    assert {second, third} <= files
+    assert first not in files and first + ".gz" not in files
+
+
+def test_manifest_is_not_cached_as_immutable(tmp_path):
+    static_dir = str(tmp_path)
+    _write(os.path.join(static_dir, "js", "app.js"), "console.log(1);")
+    hashed = build_assets(static_dir)["js/app.js"]
+
+    app = FastAPI()
+    app.mount("/static", PrecompressedStaticFiles(directory=static_dir), name="static")
+    client = TestClient(app)
+
+    assert client.get(f"/static/{DIST_DIR}/{hashed}").headers["cache-control"] == IMMUTABLE
+    assert client.get(f"/static/{DIST_DIR}/manifest.json").headers["cache-control"] == "no-cache"
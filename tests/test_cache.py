@@ -0,0 +1,169 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from database.cache import InProcessCache, RedisCache, SQLiteCache
+
+
+class RespStandIn:
+    """Минимальный RESP-сервер (GET/SET EX NX/DEL/INCR) для проверки RedisCache без Redis"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.store = {}
+        self._lock = threading.Lock()
+        self._server = socket.socket()
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen()
+        self.url = f"redis://127.0.0.1:{self._server.getsockname()[1]}/0"
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        reader = conn.makefile("rb")
+        while True:
+            line = reader.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(reader.readline()[1:])
+                args.append(reader.read(length + 2)[:-2].decode())
+            time.sleep(self.delay)
+            conn.sendall(self._reply(args))
+
+    def _reply(self, args):
+        command, key = args[0].upper(), args[1] if len(args) > 1 else None
+        with self._lock:
+            if command == "GET":
+                value = self.store.get(key)
+                if value is None:
+                    return b"$-1\r\n"
+                data = value.encode()
+                return b"$%d\r\n%s\r\n" % (len(data), data)
+            if command == "SET":
+                if "NX" in args[3:] and key in self.store:
+                    return b"$-1\r\n"
+                self.store[key] = args[2]
+                return b"+OK\r\n"
+            if command == "DEL":
+                return b":%d\r\n" % (self.store.pop(key, None) is not None)
+            if command == "INCR":
+                self.store[key] = str(int(self.store.get(key, 0)) + 1)
+                return b":%s\r\n" % self.store[key].encode()
+        return b"-ERR unknown command\r\n"
+
+    def close(self):
+        self._server.close()
+
+
+@pytest.fixture
+def resp():
+    server = RespStandIn()
+    yield server
+    server.close()
+
+
+def test_redis_single_loader_across_workers(resp):
+    first, second = RedisCache(resp.url), RedisCache(resp.url)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"value": len(calls)}
+
+    async def run():
+        return await asyncio.gather(
+            first.get_or_load("students", "1:20", loader, 30),
+            second.get_or_load("students", "1:20", loader, 30)
+        )
+
+    assert asyncio.run(run()) == [{"value": 1}, {"value": 1}]
+    assert len(calls) == 1
+
+
+def test_redis_invalidate_is_seen_by_other_workers(resp):
+    first, second = RedisCache(resp.url), RedisCache(resp.url)
+
+    async def run():
+        await first.set("students", "1:20", {"total": 1}, 30)
+        assert await second.get("students", "1:20") == {"total": 1}
+        await second.invalidate("students")
+        return await first.get("students", "1:20")
+
+    assert asyncio.run(run()) is None
+
+
+def test_redis_does_not_block_event_loop():
+    server = RespStandIn(delay=0.05)
+    cache = RedisCache(server.url)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        task = asyncio.create_task(ticker())
+        await cache.get("students", "1:20")
+        task.cancel()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.close()
+    # Два запроса по 50 мс: цикл событий продолжал работать все это время
+    assert len(ticks) >= 5
+
+
+def test_sqlite_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = SQLiteCache(path), SQLiteCache(path)
+
+    async def run():
+        value = await first.get_or_load("topics", "1:20", lambda: asyncio.sleep(0, {"total": 3}), 30)
+        assert value == {"total": 3}
+        assert await second.get("topics", "1:20") == {"total": 3}
+        await second.invalidate("topics")
+        return await first.get("topics", "1:20")
+
+    assert asyncio.run(run()) is None
+
+
+def test_in_process_cache_drops_old_generations():
+    cache = InProcessCache()
+
+    async def run():
+        for i in range(1000):
+            await cache.get_or_load("timeline", "1::20", lambda: asyncio.sleep(0, {"i": i}), 30)
+            await cache.invalidate("timeline")
+
+    asyncio.run(run())
+    assert len(cache._data) <= 2
+
+
+def test_in_process_cache_is_bounded():
+    cache = InProcessCache(max_entries=100)
+
+    async def run():
+        await cache.invalidate("students")
+        for i in range(500):
+            await cache.set("last_good:students", str(i), {"i": i}, 86400)
+        return await cache.get("last_good:students", "499")
+
+    assert asyncio.run(run()) == {"i": 499}
+    assert len(cache._data) <= 100
+    # Счетчик поколения не вытесняется
+    assert cache._get_raw("gen:students") == "1"
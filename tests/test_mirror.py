@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from database.mirror import LocalMirror
+from tests.fake_postgrest import FakePostgrest
+
+
+def _expire_sync(mirror):
+    """Считать, что все таблицы синхронизированы давно"""
+    mirror._connection().execute("UPDATE mirror_state SET synced_at = 0")
+
+
+def test_incremental_sync_picks_up_edits_and_recent_progress(client, tmp_path):
+    now = datetime.now(timezone.utc)
+    tables = {
+        "stdlist": [
+            {"id": 1, "fullname": "A", "tgid": 1, "isactive": True, "createdat": "2024-01-01", "Group": "1"},
+            {"id": 2, "fullname": "B", "tgid": 2, "isactive": True, "createdat": "2024-01-02", "Group": "1"}
+        ],
+        "topiclist": [
+            {"id": 1, "topicname": "T", "topicdesc": "", "isactive": True, "subjectid": 1, "date_of_completion": None}
+        ],
+        "sessionlist": [
+            {"id": "s1", "tgid": 1, "mode": "test", "topicid": 1, "total": 5, "current_index": 0,
+             "created_at": (now - timedelta(days=3)).isoformat(), "questions": [], "answers": []},
+            {"id": "s2", "tgid": 1, "mode": "test", "topicid": 1, "total": 5, "current_index": 0,
+             "created_at": (now - timedelta(hours=1)).isoformat(), "questions": [], "answers": []}
+        ]
+    }
+    client._client = FakePostgrest(tables)
+    client._mirror = LocalMirror(str(tmp_path / "mirror.db"))
+
+    async def run():
+        await client.sync_mirror()
+
+        tables["stdlist"][0]["isactive"] = False
+        del tables["stdlist"][1]
+        tables["topiclist"][0]["topicname"] = "T2"
+        for session in tables["sessionlist"]:
+            session["current_index"] = 3
+
+        _expire_sync(client.mirror)
+        await client.sync_mirror()
+        await client.close()
+        return client.mirror.statistics()
+
+    stats = asyncio.run(run())
+
+    assert stats["total_students"] == 1
+    assert stats["active_students"] == 0
+    progress = {s["id"]: s["current_index"] for s in stats["recent_sessions"]}
+    # Свежая сессия перечитана, старая (вне окна tail) ждет полной пересинхронизации
+    assert progress == {"s1": 0, "s2": 3}
+    assert {s["topicname"] for s in stats["recent_sessions"]} == {"T2"}
+    # questions/answers в зеркало не читаются
+    row = client.mirror._connection().execute("SELECT data FROM sessionlist WHERE id = 's2'").fetchone()
+    assert "questions" not in row["data"]
+
+
+def test_due_full_resync_runs_in_background(client, tmp_path):
+    now = datetime.now(timezone.utc)
+    tables = {"sessionlist": [
+        {"id": "s1", "tgid": 1, "mode": "test", "topicid": 1, "total": 5, "current_index": 0,
+         "created_at": (now - timedelta(days=3)).isoformat()}
+    ]}
+    client._client = FakePostgrest(tables)
+    client._mirror = LocalMirror(str(tmp_path / "mirror.db"))
+
+    async def run():
+        await client.sync_mirror()
+        tables["sessionlist"][0]["current_index"] = 4
+        client.mirror._connection().execute("UPDATE mirror_state SET synced_at = 0, full_synced_at = 0")
+
+        await client.sync_mirror()
+        assert client._mirror_resync is not None
+        await client._mirror_resync
+        return client.mirror.statistics()
+
+    stats = asyncio.run(run())
+    assert stats["recent_sessions"][0]["current_index"] == 4
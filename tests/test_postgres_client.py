@@ -0,0 +1,218 @@
+"""Сверка PostgresClient с PostgREST-веткой на локальном Postgres.
+
+Запускается, только если задан DATABASE_DSN (например,
+postgresql://postgres@localhost/postgres): тесты создают временную
+схему, загружают в нее небольшой набор данных и функцию student_timeline,
+а PostgREST-ветка читает те же строки через фейковый клиент.
+"""
+import asyncio
+import json
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+import pytest
+
+from config import get_settings
+from database.postgres_client import PostgresClient
+from database.supabase_client import SupabaseClient
+from tests.fake_postgrest import FakePostgrest
+
+DSN = os.environ.get("DATABASE_DSN")
+asyncpg = pytest.importorskip("asyncpg") if DSN else None
+
+pytestmark = pytest.mark.skipif(not DSN, reason="DATABASE_DSN не задан")
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "sql")
+
+SCHEMA = """
+CREATE TABLE stdlist (
+    id bigint PRIMARY KEY, fullname text, tgid bigint, isactive boolean,
+    createdat timestamptz, "Group" text
+);
+CREATE TABLE subjectlist (id bigint PRIMARY KEY, subjectname text);
+CREATE TABLE topiclist (
+    id bigint PRIMARY KEY, topicname text, topicdesc text, isactive boolean,
+    subjectid bigint, date_of_completion date, raglink text
+);
+CREATE TABLE sessionlist (
+    id uuid PRIMARY KEY, tgid bigint, mode text, topicid bigint, total integer,
+    current_index integer, created_at timestamptz, questions jsonb, answers jsonb
+);
+CREATE TABLE tasklist (id bigint PRIMARY KEY, studentid bigint, topicid bigint, created_at timestamptz);
+CREATE TABLE testlist (id bigint PRIMARY KEY, studentid bigint, topicid bigint, createdat timestamptz);
+CREATE TABLE student_progress (
+    studentid bigint, topicid bigint, topicname text,
+    practice_done boolean, practice_score integer, test_done boolean, test_score integer
+);
+"""
+
+
+def _ts(dt: datetime) -> str:
+    """Время в том виде, в каком его отдает PostgREST (UTC, без микросекунд)"""
+    return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def _rows():
+    now = datetime.now(timezone.utc)
+    return {
+        "stdlist": [
+            {"id": 1, "fullname": "Иван Петров", "tgid": 101, "isactive": True,
+             "createdat": _ts(now - timedelta(days=30)), "Group": "A"},
+            {"id": 2, "fullname": "Мария", "tgid": 102, "isactive": False,
+             "createdat": _ts(now - timedelta(days=2)), "Group": "B"},
+            {"id": 3, "fullname": "Олег Сидоров Младший", "tgid": 103, "isactive": True,
+             "createdat": _ts(now - timedelta(days=1)), "Group": "A"}
+        ],
+        "subjectlist": [{"id": 1, "subjectname": "Математика"}],
+        "topiclist": [
+            {"id": 1, "topicname": "Дроби", "topicdesc": "", "isactive": True, "subjectid": 1,
+             "date_of_completion": "2024-03-01", "raglink": ""},
+            {"id": 2, "topicname": "Уравнения", "topicdesc": "Линейные", "isactive": False, "subjectid": None,
+             "date_of_completion": None, "raglink": ""}
+        ],
+        "sessionlist": [
+            {"id": "00000000-0000-0000-0000-000000000001", "tgid": 101, "mode": "test", "topicid": 1,
+             "total": 3, "current_index": 1, "created_at": _ts(now - timedelta(hours=1)),
+             "questions": ["2/4?", "3/6?", "1/2?"], "answers": ["1/2"]},
+            {"id": "00000000-0000-0000-0000-000000000002", "tgid": 102, "mode": "learning", "topicid": 2,
+             "total": 2, "current_index": 2, "created_at": _ts(now - timedelta(hours=2)),
+             "questions": ["x+1=2", "2x=4"], "answers": ["1", "2"]},
+            {"id": "00000000-0000-0000-0000-000000000003", "tgid": 101, "mode": "test", "topicid": 1,
+             "total": 3, "current_index": 0, "created_at": _ts(now - timedelta(days=3)),
+             "questions": ["1/3?"], "answers": []}
+        ],
+        "tasklist": [
+            {"id": 1, "studentid": 1, "topicid": 1, "created_at": _ts(now - timedelta(days=5))},
+            {"id": 2, "studentid": 1, "topicid": 2, "created_at": _ts(now - timedelta(days=4))},
+            {"id": 3, "studentid": 3, "topicid": 1, "created_at": _ts(now - timedelta(days=1))}
+        ],
+        "testlist": [
+            {"id": 1, "studentid": 1, "topicid": 1, "createdat": _ts(now - timedelta(days=3, hours=12))}
+        ],
+        "student_progress": [
+            {"studentid": 1, "topicid": 1, "topicname": "Дроби", "practice_done": True, "practice_score": 80,
+             "test_done": True, "test_score": 90},
+            {"studentid": 1, "topicid": 2, "topicname": "Уравнения", "practice_done": True, "practice_score": 60,
+             "test_done": False, "test_score": None},
+            {"studentid": 3, "topicid": 1, "topicname": "Дроби", "practice_done": False, "practice_score": None,
+             "test_done": False, "test_score": None},
+            {"studentid": 3, "topicid": 2, "topicname": "Уравнения", "practice_done": False,
+             "practice_score": None, "test_done": False, "test_score": None}
+        ]
+    }
+
+
+@pytest.fixture(scope="module")
+def database():
+    """Временная схема с данными; DSN клиента указывает на нее через search_path"""
+    schema = f"test_{secrets.token_hex(4)}"
+    rows = _rows()
+
+    async def setup():
+        conn = await asyncpg.connect(DSN)
+        try:
+            await conn.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema};")
+            await conn.execute(SCHEMA)
+            with open(os.path.join(SQL_DIR, "student_timeline.sql"), encoding="utf-8") as f:
+                await conn.execute(f.read())
+            for table, table_rows in rows.items():
+                await conn.execute(
+                    f"INSERT INTO {table} SELECT * FROM json_populate_recordset(NULL::{table}, $1::json)",
+                    json.dumps(table_rows)
+                )
+        finally:
+            await conn.close()
+
+    async def teardown():
+        conn = await asyncpg.connect(DSN)
+        try:
+            await conn.execute(f"DROP SCHEMA {schema} CASCADE")
+        finally:
+            await conn.close()
+
+    asyncio.run(setup())
+    separator = "&" if "?" in DSN else "?"
+    yield f"{DSN}{separator}{urlencode({'search_path': schema, 'timezone': 'UTC'})}", rows
+    asyncio.run(teardown())
+
+
+@pytest.fixture
+def clients(database, monkeypatch):
+    dsn, rows = database
+    monkeypatch.setenv("SUPABASE_URL", "http://localhost")
+    monkeypatch.setenv("SUPABASE_KEY", "key")
+    monkeypatch.setenv("ADMIN_USERNAME", "admin")
+    monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    monkeypatch.setenv("DATABASE_DSN", dsn)
+    get_settings.cache_clear()
+
+    rest = SupabaseClient()
+    rest._client = FakePostgrest(rows)
+    yield PostgresClient(), rest
+    get_settings.cache_clear()
+
+
+def _both(clients, method: str, *args):
+    postgres, rest = clients
+
+    async def run():
+        try:
+            return (
+                await getattr(postgres, method)(*args),
+                await getattr(rest, method)(*args)
+            )
+        finally:
+            await postgres.close()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("page", [1, 2])
+def test_students_match_postgrest(clients, page):
+    direct, via_rest = _both(clients, "_fetch_students", page, 2)
+    assert direct == via_rest
+
+
+def test_topics_match_postgrest(clients):
+    direct, via_rest = _both(clients, "_fetch_topics", 1, 20)
+    assert direct == via_rest
+
+
+def test_sessions_match_postgrest(clients):
+    direct, via_rest = _both(clients, "_fetch_sessions", 1, 20)
+    assert direct == via_rest
+    # Текущий вопрос берется из jsonb-массива оператором ->
+    assert direct["data"][0]["current_question"] == "3/6?"
+
+
+def test_student_progress_matches_postgrest(clients):
+    direct, via_rest = _both(clients, "_fetch_student_progress")
+    assert direct == via_rest
+
+
+def test_statistics_match_postgrest(clients):
+    direct, via_rest = _both(clients, "_fetch_statistics")
+    assert direct == via_rest
+    assert direct["active_sessions"] == 2
+
+
+def test_student_timeline_function(clients):
+    postgres, _ = clients
+
+    async def run():
+        try:
+            return await postgres._fetch_student_timeline(1, None, None, 10)
+        finally:
+            await postgres.close()
+
+    timeline = asyncio.run(run())
+    assert [event["key"] for event in timeline["events"]] == [
+        "session:00000000-0000-0000-0000-000000000001",
+        "session:00000000-0000-0000-0000-000000000003",
+        "test:1",
+        "task:2",
+        "task:1"
+    ]
+    assert [row["topicid"] for row in timeline["progress"]] == [1, 2]
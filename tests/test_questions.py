@@ -0,0 +1,73 @@
+from analytics.questions import QuestionAnalytics
+
+
+def _session(session_id, current_index, answers, created_at="2024-01-01T10:00:00+00:00", topic=1, total=3):
+    return {
+        "id": session_id,
+        "topicid": topic,
+        "created_at": created_at,
+        "current_index": current_index,
+        "total": total,
+        "questions": ["q1", "q2", "q3"],
+        "answers": answers
+    }
+
+
+def test_topic_stats_counts_only_reached_questions():
+    analytics = QuestionAnalytics()
+    analytics.add_frozen([
+        _session("a", 3, [{"correct": True}, {"correct": False}, {"correct": True}]),
+        _session("b", 1, [{"correct": True}]),
+        _session("c", 0, [])
+    ])
+
+    stats = analytics.topic_stats(1)
+
+    assert stats["sessions"] == 3
+    assert stats["completed_sessions"] == 1
+    assert [p["reached"] for p in stats["positions"]] == [3, 2, 1]
+    assert [p["dropoff"] for p in stats["positions"]] == [1, 1, 0]
+
+    questions = {q["question"]: q for q in stats["questions"]}
+    assert questions["q1"]["asked"] == 3
+    assert questions["q1"]["answer_rate"] == 66.7
+    # q2 задан двум сессиям, ответ только в сессии a, и он неверный
+    assert questions["q2"]["asked"] == 2
+    assert questions["q2"]["accuracy"] == 0.0
+    # До q3 дошла только сессия a; сессии b и c его не видели
+    assert questions["q3"]["asked"] == 1
+    assert questions["q3"]["answer_rate"] == 100.0
+
+
+def test_topic_stats_merges_tail_and_ignores_other_topics():
+    analytics = QuestionAnalytics()
+    analytics.add_frozen([_session("a", 3, ["x", "y", "z"])])
+    analytics.replace_tail([
+        _session("b", 1, ["x"], created_at="2024-01-02T10:00:00+00:00"),
+        _session("c", 2, ["x", "y", "z"], topic=2)
+    ])
+
+    stats = analytics.topic_stats(1)
+
+    assert stats["sessions"] == 2
+    assert [p["reached"] for p in stats["positions"]] == [2, 2, 1]
+    assert {q["question"]: q["asked"] for q in stats["questions"]} == {"q1": 2, "q2": 2, "q3": 1}
+
+
+def test_snapshot_restores_frozen_sessions_in_another_instance():
+    source = QuestionAnalytics()
+    source.add_frozen([
+        _session("a", 3, [{"correct": True}, {"correct": False}, {"correct": True}]),
+        _session("b", 1, [{"correct": True}], created_at="2024-01-02T10:00:00+00:00")
+    ])
+
+    restored = QuestionAnalytics()
+    assert restored.restore(source.snapshot())
+    assert restored.topic_stats(1) == {**source.topic_stats(1), "version": restored.version}
+    # Сессия на водяном знаке не добавляется повторно, более новая — добавляется
+    assert restored.add_frozen([
+        _session("b", 1, [], created_at="2024-01-02T10:00:00+00:00"),
+        _session("c", 0, [], created_at="2024-01-03T10:00:00+00:00")
+    ]) == 1
+    # Более старый снимок не затирает свежие данные
+    assert not restored.restore(source.snapshot())
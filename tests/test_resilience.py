@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from database.resilience import BackendGuard, BackendUnavailable, is_transient
+
+
+def _guard(**kwargs):
+    options = {"timeout": 1.0, "retries": 0, "base_delay": 0.0, "failure_threshold": 2, "reset_seconds": 0.05}
+    options.update(kwargs)
+    return BackendGuard(**options)
+
+
+async def _fail():
+    raise ConnectionError("refused")
+
+
+async def _ok():
+    return "ok"
+
+
+def test_breaker_opens_after_threshold_and_recovers():
+    guard = _guard()
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(BackendUnavailable):
+                await guard.call_async("stdlist", _fail)
+        assert guard.breaker("stdlist").state == "open"
+        with pytest.raises(BackendUnavailable, match="предохранитель"):
+            await guard.call_async("stdlist", _ok)
+
+        await asyncio.sleep(0.06)
+        assert guard.breaker("stdlist").state == "half_open"
+        assert await guard.call_async("stdlist", _ok) == "ok"
+        assert guard.breaker("stdlist").state == "closed"
+
+    asyncio.run(run())
+
+
+def test_failed_probe_reopens_breaker():
+    guard = _guard()
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(BackendUnavailable):
+                await guard.call_async("stdlist", _fail)
+        await asyncio.sleep(0.06)
+        with pytest.raises(BackendUnavailable):
+            await guard.call_async("stdlist", _fail)
+        assert guard.breaker("stdlist").state == "open"
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_releases_half_open_breaker():
+    guard = _guard()
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(BackendUnavailable):
+                await guard.call_async("stdlist", _fail)
+        await asyncio.sleep(0.06)
+
+        probe = asyncio.create_task(guard.call_async("stdlist", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert guard.breaker("stdlist").state == "half_open"
+        assert await guard.call_async("stdlist", _ok) == "ok"
+        assert guard.breaker("stdlist").state == "closed"
+
+    asyncio.run(run())
+
+
+def test_request_errors_do_not_open_breaker():
+    guard = _guard()
+
+    class PostgrestError(Exception):
+        code = "PGRST116"
+
+    async def not_found():
+        raise PostgrestError("0 rows")
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(PostgrestError):
+                await guard.call_async("stdlist", not_found)
+        assert guard.breaker("stdlist").state == "closed"
+
+    asyncio.run(run())
+
+
+def test_is_transient_codes():
+    def error(code):
+        e = Exception()
+        e.code = code
+        return e
+
+    assert is_transient(error("503"))
+    assert is_transient(error("PGRST002"))
+    assert is_transient(error("57P03"))
+    assert not is_transient(error("404"))
+    assert not is_transient(error("23505"))
+    assert not is_transient(error("PGRST116"))
@@ -0,0 +1,83 @@
+import asyncio
+import socket
+
+from database.cache import InProcessCache, RedisCache, SQLiteCache
+from database.supabase_client import SupabaseClient
+from tests.fake_postgrest import FakePostgrest
+
+
+def _refused_redis() -> RedisCache:
+    """RedisCache на порт, где никто не слушает"""
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return RedisCache(f"redis://127.0.0.1:{port}/0", timeout=0.2)
+
+
+def test_cache_outage_falls_through_to_backend(client):
+    client._cache = _refused_redis()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return {"total_students": 7}
+
+    result = asyncio.run(client._cached("statistics", "all", loader, fallback={"total_students": 0}))
+
+    assert result == {"total_students": 7}
+    assert calls == [1]
+
+
+def test_backend_outage_returns_last_good(client):
+    client._cache = InProcessCache()
+
+    async def healthy():
+        return {"total_students": 7}
+
+    async def broken():
+        raise ConnectionError("refused")
+
+    async def run():
+        await client._cached("statistics", "all", healthy, fallback={}, ttl=1)
+        await client.cache.invalidate("statistics")
+        stale = await client._cached("statistics", "all", broken, fallback={})
+        missing = await client._cached("statistics", "other", broken, fallback={"total_students": 0})
+        return stale, missing
+
+    stale, missing = asyncio.run(run())
+    assert stale == {"total_students": 7, "stale": True}
+    assert missing == {"total_students": 0, "unavailable": True}
+
+
+def test_question_history_is_read_by_one_worker(client, tmp_path):
+    sessions = [
+        {"id": f"s{i}", "topicid": 1, "mode": "test", "created_at": f"2024-01-0{i + 1}T10:00:00+00:00",
+         "current_index": 1, "total": 2, "questions": ["q1", "q2"], "answers": ["a"]}
+        for i in range(3)
+    ]
+    reads = []
+
+    class CountingPostgrest(FakePostgrest):
+        def table(self, name):
+            query = super().table(name)
+            execute = query.execute
+
+            def counted():
+                response = execute()
+                reads.extend(response.data)
+                return response
+            query.execute = counted
+            return query
+
+    second = SupabaseClient()
+    for worker in (client, second):
+        worker._client = CountingPostgrest({"sessionlist": sessions})
+        worker._cache = SQLiteCache(str(tmp_path / "cache.db"))
+
+    asyncio.run(client.refresh_question_analytics())
+    assert len(reads) == 3
+    asyncio.run(second.refresh_question_analytics())
+    # Второй воркер перечитывает только сессию на водяном знаке
+    assert len(reads) == 4
+    assert second.questions.topic_stats(1)["sessions"] == 3